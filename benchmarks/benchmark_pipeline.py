@@ -0,0 +1,228 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import queue
+import random
+import shutil
+import subprocess
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+repository_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(repository_directory)
+sys.path.append(os.path.join(repository_directory, 'dataset_distribution'))
+sys.path.append(os.path.join(repository_directory, 'image_generation', 'superposition_cut'))
+from generate_dataset import generate_dataset
+
+STAGES = ('distribute_images', 'split_data', 'split_data_balanced', 'modify_to_class_boat', 'process_images')
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process and its finished children.
+
+    Returns:
+        float or None: Peak RSS in MiB, or None where the resource module is not available.
+    """
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+def prepare_stage(stage, dataset_directory, work_directory):
+    """
+    Reset the working directory of a stage. This is not part of the measured time.
+
+    Args:
+        stage (str): Name of the stage.
+        dataset_directory (str): Directory of the generated dataset.
+        work_directory (str): Working directory of the stage, emptied first.
+    """
+    if os.path.exists(work_directory):
+        shutil.rmtree(work_directory)
+    os.makedirs(work_directory)
+    if stage == 'modify_to_class_boat':
+        # The labels are modified in place, so the stage works on a copy
+        shutil.copytree(os.path.join(dataset_directory, 'labels'), os.path.join(work_directory, 'labels'))
+    elif stage == 'process_images':
+        os.makedirs(os.path.join(work_directory, 'composites'))
+
+def run_stage(stage, dataset_directory, work_directory, workers):
+    """
+    Run one pipeline stage on the generated dataset.
+
+    Args:
+        stage (str): Name of the stage.
+        dataset_directory (str): Directory of the generated dataset.
+        work_directory (str): Working directory of the stage, where its outputs are written.
+        workers (int): Number of worker processes for the stages that support them.
+    """
+    images_directory = os.path.join(dataset_directory, 'images')
+    labels_directory = os.path.join(dataset_directory, 'labels')
+    random.seed(0)
+
+    if stage == 'distribute_images':
+        from histogram_distribution_valid_train import distribute_images
+        os.chdir(work_directory)
+        distribute_images(images_directory, labels_directory, use_features=False)
+    elif stage == 'split_data':
+        from random_distribution_valid_train import split_data
+        split_data(dataset_directory, os.path.join(work_directory, 'split'))
+    elif stage == 'split_data_balanced':
+        from random_distribution_valid_train import split_data
+        split_data(dataset_directory, os.path.join(work_directory, 'split'), balanced=True)
+    elif stage == 'modify_to_class_boat':
+        from change_to_class_boat import modify_to_class_boat
+        modify_to_class_boat(os.path.join(work_directory, 'labels'))
+    elif stage == 'process_images':
+        from superposition_cut import process_images
+        process_images(os.path.join(dataset_directory, 'ir'), os.path.join(dataset_directory, 'backgrounds'),
+                       os.path.join(work_directory, 'composites'), workers=workers)
+    else:
+        raise ValueError(f"Unknown stage: {stage}")
+
+def stage_process(results, stage, dataset_directory, work_directory, workers):
+    """
+    Run a stage in a fresh process and report its time, peak memory and stage timings.
+    """
+    record = {'seconds': None, 'peak_rss_mb': None, 'stages': {}, 'error': None}
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            start_time = time.perf_counter()
+            run_stage(stage, dataset_directory, work_directory, workers)
+            record['seconds'] = time.perf_counter() - start_time
+        from common.instrumentation import metrics
+        record['stages'] = metrics.snapshot()['stages']
+    except BaseException as e:
+        record['error'] = f'{type(e).__name__}: {e}'
+    record['peak_rss_mb'] = peak_rss_mb()
+    results.put(record)
+
+def measure_stage(stage, dataset_directory, work_directory, workers):
+    """
+    Measure one stage in a spawned process, so its peak memory does not include earlier stages.
+
+    Returns:
+        dict: Seconds, peak RSS in MiB, stage timings and error message, if any.
+    """
+    prepare_stage(stage, dataset_directory, work_directory)
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=stage_process,
+                              args=(results, stage, dataset_directory, work_directory, workers))
+    process.start()
+    while True:
+        try:
+            record = results.get(timeout=1)
+            break
+        except queue.Empty:
+            # A process killed by the system, for example when out of memory, reports nothing
+            if not process.is_alive():
+                record = {'seconds': None, 'peak_rss_mb': None, 'stages': {},
+                          'error': f'process exited with code {process.exitcode}'}
+                break
+    process.join()
+    return record
+
+def current_commit():
+    """
+    Get the commit the repository is at.
+
+    Returns:
+        str or None: Abbreviated commit hash, or None outside a git checkout.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=repository_directory,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def benchmark(dataset_directory, work_directory, results_path, stages=STAGES, workers=0, **options):
+    """
+    Generate the synthetic dataset if needed, run every stage on it and append the results.
+
+    Each result is one JSON line with the commit, the dataset scale, the time, the peak RSS
+    and the files processed per second of a stage, so runs can be compared across commits.
+
+    Args:
+        dataset_directory (str): Directory of the generated dataset.
+        work_directory (str): Directory where the stages write their outputs.
+        results_path (str): JSON lines file where the results are appended.
+        stages (list): Names of the stages to run.
+        workers (int): Number of worker processes for process_images.
+        **options: Options passed to generate_dataset.
+
+    Returns:
+        list: The result records.
+    """
+    dataset_directory = os.path.abspath(dataset_directory)
+    work_directory = os.path.abspath(work_directory)
+    description = generate_dataset(dataset_directory, **options)
+    files = {
+        'distribute_images': description['images'],
+        'split_data': description['images'],
+        'split_data_balanced': description['images'],
+        'modify_to_class_boat': description['images'],
+        'process_images': description['ir_images'],
+    }
+
+    commit = current_commit()
+    records = []
+    for stage in stages:
+        measured = measure_stage(stage, dataset_directory, os.path.join(work_directory, stage), workers)
+        seconds = measured['seconds']
+        record = {
+            'time': time.time(),
+            'commit': commit,
+            'stage': stage,
+            'images': description['images'],
+            'ir_images': description['ir_images'],
+            'workers': workers,
+            'files': files[stage],
+            'seconds': seconds,
+            'files_per_second': files[stage] / seconds if seconds else None,
+            'peak_rss_mb': measured['peak_rss_mb'],
+            'stages': measured['stages'],
+            'error': measured['error'],
+        }
+        records.append(record)
+
+        if record['error'] is not None:
+            print(f"{stage}: failed ({record['error']})")
+        else:
+            rss = f"{record['peak_rss_mb']:.0f} MiB" if record['peak_rss_mb'] is not None else 'n/a'
+            print(f"{stage}: {files[stage]} files in {seconds:.2f} s "
+                  f"({record['files_per_second']:.1f} files/s), peak RSS {rss}")
+
+    with open(results_path, 'a') as file:
+        for record in records:
+            file.write(json.dumps(record) + '\n')
+    print(f"Results appended to '{results_path}'.")
+    return records
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline stages on a synthetic maritime dataset.')
+    parser.add_argument('--data', default='benchmark_data', help='Directory of the generated dataset.')
+    parser.add_argument('--work', default='benchmark_work', help='Directory where the stages write their outputs.')
+    parser.add_argument('--results', default='benchmark_results.jsonl', help='JSON lines file where results are appended.')
+    parser.add_argument('--images', type=int, default=1000, help='Number of labeled images (1000 to 100000).')
+    parser.add_argument('--ir-images', type=int, default=None, help='Number of infrared cut-outs (default: --images).')
+    parser.add_argument('--backgrounds', type=int, default=50, help='Number of sea backgrounds.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--workers', type=int, default=0, help='Worker processes for process_images.')
+    args = parser.parse_args()
+
+    benchmark(args.data, args.work, args.results, args.stages, args.workers, images=args.images,
+              ir_images=args.ir_images, backgrounds=args.backgrounds, seed=args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+DATASET_FILE = 'dataset.json'
+
+def sea_background(rng, size):
+    """
+    Generate a sea background with a sky, a horizon and waves.
+
+    Args:
+        rng (numpy.random.Generator): Random generator.
+        size (tuple): Size (width, height) of the image.
+
+    Returns:
+        numpy array: (height, width, 3) uint8 RGB image.
+    """
+    width, height = size
+    horizon = int(rng.integers(height // 5, height // 2))
+    rows = np.arange(height, dtype=np.float32)[:, None, None]
+    columns = np.arange(width, dtype=np.float32)[None, :, None]
+
+    sky_top = rng.uniform([90, 130, 180], [150, 180, 230]).astype(np.float32)
+    sky_bottom = rng.uniform([180, 200, 210], [230, 235, 245]).astype(np.float32)
+    sea_top = rng.uniform([40, 80, 100], [90, 130, 150]).astype(np.float32)
+    sea_bottom = rng.uniform([10, 30, 50], [40, 70, 90]).astype(np.float32)
+
+    sky_weight = np.clip(rows / max(horizon, 1), 0, 1)
+    sea_weight = np.clip((rows - horizon) / max(height - horizon, 1), 0, 1)
+    sky = sky_top + (sky_bottom - sky_top) * sky_weight
+    sea = sea_top + (sea_bottom - sea_top) * sea_weight
+
+    # Waves get longer and stronger towards the bottom of the image
+    wavelength = 4 + 28 * sea_weight
+    phase = rng.uniform(0, 2 * np.pi)
+    waves = np.sin(columns / wavelength + rows * 0.7 + phase) * (2 + 10 * sea_weight)
+
+    image = np.where(rows < horizon, sky, sea + waves)
+    image += rng.normal(0, 3, (height, width, 1)).astype(np.float32)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+def ship_cutout(rng, size):
+    """
+    Generate an infrared ship silhouette on a transparent background.
+
+    Args:
+        rng (numpy.random.Generator): Random generator.
+        size (tuple): Size (width, height) of the cut-out.
+
+    Returns:
+        PIL.Image.Image: RGBA image with a warm, grayscale ship and an alpha mask.
+    """
+    width, height = size
+    mask = Image.new('L', size, 0)
+    draw = ImageDraw.Draw(mask)
+
+    waterline = int(height * rng.uniform(0.75, 0.9))
+    deck = int(height * rng.uniform(0.5, 0.65))
+    bow = int(width * rng.uniform(0.05, 0.15))
+    stern = int(width * rng.uniform(0.9, 0.97))
+    draw.polygon([(0, deck), (width - 1, deck), (stern, waterline), (bow, waterline)], fill=255)
+
+    cabin_left = int(width * rng.uniform(0.2, 0.5))
+    cabin_right = cabin_left + int(width * rng.uniform(0.15, 0.35))
+    cabin_top = int(deck * rng.uniform(0.3, 0.7))
+    draw.rectangle([cabin_left, cabin_top, cabin_right, deck], fill=255)
+
+    mast = int(width * rng.uniform(0.3, 0.7))
+    draw.rectangle([mast, int(cabin_top * rng.uniform(0.0, 0.3)), mast + max(1, width // 60), cabin_top], fill=255)
+
+    # Hot engine area towards the stern, cooler hull towards the bow
+    heat = np.linspace(140, 230, width, dtype=np.float32)[None, :]
+    heat = heat + rng.normal(0, 8, (height, width)).astype(np.float32)
+    gray = np.clip(heat, 0, 255).astype(np.uint8)
+
+    cutout = Image.fromarray(np.dstack([gray, gray, gray]), 'RGB').convert('RGBA')
+    cutout.putalpha(mask)
+    return cutout
+
+def labeled_image(rng, size, max_boxes, classes):
+    """
+    Generate a sea image with ships and its YOLO label.
+
+    Args:
+        rng (numpy.random.Generator): Random generator.
+        size (tuple): Size (width, height) of the image.
+        max_boxes (int): Maximum number of ships in the image.
+        classes (int): Number of classes the ships are drawn from.
+
+    Returns:
+        tuple: (image, label) where image is a PIL RGB image and label the YOLO label text.
+    """
+    width, height = size
+    image = Image.fromarray(sea_background(rng, size), 'RGB')
+    lines = []
+    for _ in range(int(rng.integers(1, max_boxes + 1))):
+        ship_width = int(width * rng.uniform(0.05, 0.35))
+        ship_height = max(4, int(ship_width * rng.uniform(0.3, 0.6)))
+        ship = ship_cutout(rng, (ship_width, ship_height))
+        x = int(rng.integers(0, width - ship_width))
+        y = int(rng.integers(height // 3, height - ship_height))
+        image.paste(ship, (x, y), ship)
+        lines.append(f'{int(rng.integers(0, classes))} {(x + ship_width / 2) / width:.6f} '
+                     f'{(y + ship_height / 2) / height:.6f} {ship_width / width:.6f} {ship_height / height:.6f}')
+    return image, '\n'.join(lines) + '\n'
+
+def generate_item(task):
+    """
+    Generate and save one item of the dataset.
+
+    Args:
+        task (tuple): (kind, index, dataset_directory, options) where kind is 'image',
+            'background' or 'ir' and options is the dataset description.
+    """
+    kind, index, dataset_directory, options = task
+    kind_id = ('image', 'background', 'ir').index(kind)
+    rng = np.random.default_rng([options['seed'], kind_id, index])
+    size = tuple(options['size'])
+
+    if kind == 'image':
+        image, label = labeled_image(rng, size, options['max_boxes'], options['classes'])
+        image.save(os.path.join(dataset_directory, 'images', f'img_{index:06d}.jpg'), quality=90)
+        with open(os.path.join(dataset_directory, 'labels', f'img_{index:06d}.txt'), 'w') as file:
+            file.write(label)
+    elif kind == 'background':
+        background = Image.fromarray(sea_background(rng, size), 'RGB')
+        background.save(os.path.join(dataset_directory, 'backgrounds', f'sea_{index:04d}.jpg'), quality=90)
+    else:
+        ship_width = int(rng.integers(size[0] // 4, size[0] // 2))
+        ship = ship_cutout(rng, (ship_width, max(8, int(ship_width * rng.uniform(0.3, 0.6)))))
+        ship.save(os.path.join(dataset_directory, 'ir', f'ship_ir_{index:06d}.png'))
+
+def load_description(dataset_directory):
+    """
+    Load the description of a generated dataset.
+
+    Args:
+        dataset_directory (str): Directory of the dataset.
+
+    Returns:
+        dict or None: Options the dataset was generated with, or None if there is no dataset.
+    """
+    try:
+        with open(os.path.join(dataset_directory, DATASET_FILE), 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+def generate_dataset(dataset_directory, images=1000, ir_images=None, backgrounds=50, size=(640, 480),
+                     max_boxes=4, classes=3, seed=0, workers=None):
+    """
+    Generate a reproducible synthetic maritime dataset.
+
+    The dataset directory holds:
+
+    - images/ and labels/: sea images with ships and their YOLO labels.
+    - backgrounds/: sea backgrounds without ships.
+    - ir/: infrared ship cut-outs with an alpha channel.
+
+    Every item is generated from the seed and its index only, so the same options always
+    give the same files. A dataset already generated with the same options is reused.
+
+    Args:
+        dataset_directory (str): Directory of the dataset.
+        images (int): Number of labeled images.
+        ir_images (int or None): Number of infrared cut-outs, the number of images if None.
+        backgrounds (int): Number of backgrounds.
+        size (tuple): Size (width, height) of the images and backgrounds.
+        max_boxes (int): Maximum number of ships per labeled image.
+        classes (int): Number of classes in the labels.
+        seed (int): Seed of the dataset.
+        workers (int or None): Number of worker processes, all CPUs if None.
+
+    Returns:
+        dict: Options the dataset was generated with.
+    """
+    options = {
+        'images': images,
+        'ir_images': images if ir_images is None else ir_images,
+        'backgrounds': backgrounds,
+        'size': list(size),
+        'max_boxes': max_boxes,
+        'classes': classes,
+        'seed': seed,
+    }
+    if load_description(dataset_directory) == options:
+        print(f"Reusing the dataset in '{dataset_directory}'.")
+        return options
+
+    for subdirectory in ('images', 'labels', 'backgrounds', 'ir'):
+        os.makedirs(os.path.join(dataset_directory, subdirectory), exist_ok=True)
+    description_path = os.path.join(dataset_directory, DATASET_FILE)
+    if os.path.exists(description_path):
+        os.remove(description_path)
+
+    tasks = [('image', index, dataset_directory, options) for index in range(options['images'])]
+    tasks += [('background', index, dataset_directory, options) for index in range(options['backgrounds'])]
+    tasks += [('ir', index, dataset_directory, options) for index in range(options['ir_images'])]
+
+    start_time = time.perf_counter()
+    with multiprocessing.Pool(workers) as pool:
+        for _ in pool.imap_unordered(generate_item, tasks, chunksize=32):
+            pass
+    elapsed = time.perf_counter() - start_time
+
+    with open(description_path, 'w') as file:
+        json.dump(options, file, indent=4)
+    print(f"Generated {len(tasks)} files in '{dataset_directory}' in {elapsed:.1f} s.")
+    return options
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic maritime dataset for benchmarks.')
+    parser.add_argument('dataset_directory', nargs='?', default='benchmark_data')
+    parser.add_argument('--images', type=int, default=1000, help='Number of labeled images.')
+    parser.add_argument('--ir-images', type=int, default=None, help='Number of infrared cut-outs (default: --images).')
+    parser.add_argument('--backgrounds', type=int, default=50, help='Number of sea backgrounds.')
+    parser.add_argument('--size', nargs=2, type=int, default=(640, 480), metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes.')
+    args = parser.parse_args()
+
+    generate_dataset(args.dataset_directory, args.images, args.ir_images, args.backgrounds, tuple(args.size),
+                     seed=args.seed, workers=args.workers)
+
+if __name__ == "__main__":
+    main()
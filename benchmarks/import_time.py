@@ -0,0 +1,78 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+repository_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(repository_directory)
+from pipeline import COMMANDS
+
+# Modules the CLI must not load before a subcommand runs
+HEAVY_MODULES = ('numpy', 'cv2', 'PIL', 'sklearn', 'requests', 'onvif', 'zeep')
+
+def measure_cli_import():
+    """
+    Import the CLI in a fresh interpreter.
+
+    Returns:
+        tuple: (milliseconds, heavy_modules) with the cumulative import time of the CLI module
+            reported by -X importtime and the heavy modules it loaded.
+    """
+    code = f"import sys, pipeline; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=repository_directory,
+                               capture_output=True, text=True, check=True)
+    microseconds = None
+    for line in completed.stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == 'pipeline':
+            microseconds = int(fields[1].split()[-1])
+    heavy_modules = [module for module in completed.stdout.strip().split(',') if module]
+    return microseconds / 1000, heavy_modules
+
+def measure_help(command, method=None):
+    """
+    Time `pipeline.py <command> --help` in a fresh interpreter, which imports the script of the command.
+
+    Args:
+        command (str): Subcommand.
+        method (str or None): Method of the subcommand.
+
+    Returns:
+        float: Wall time in milliseconds.
+    """
+    arguments = [sys.executable, os.path.join(repository_directory, 'pipeline.py'), command]
+    if method is not None:
+        arguments += ['--method', method]
+    start_time = time.perf_counter()
+    subprocess.run(arguments + ['--help'], capture_output=True, check=False)
+    return 1000 * (time.perf_counter() - start_time)
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the import time budget of the pipeline CLI.')
+    parser.add_argument('--budget-ms', type=float, default=50.0, help='Maximum cumulative import time of the CLI.')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of measurements; the fastest is kept.')
+    args = parser.parse_args()
+
+    measurements = [measure_cli_import() for _ in range(args.repeat)]
+    milliseconds = min(milliseconds for milliseconds, _ in measurements)
+    heavy_modules = measurements[0][1]
+    print(f"pipeline import: {milliseconds:.1f} ms (budget {args.budget_ms:.1f} ms)")
+
+    for command, (_, methods) in COMMANDS.items():
+        for method in methods:
+            method = method if len(methods) > 1 else None
+            name = command if method is None else f'{command} --method {method}'
+            print(f"pipeline.py {name} --help: {measure_help(command, method):.0f} ms")
+
+    failed = False
+    if heavy_modules:
+        print(f"The CLI imports heavy modules at start: {', '.join(heavy_modules)}")
+        failed = True
+    if milliseconds > args.budget_ms:
+        print(f"The CLI import time exceeds the budget by {milliseconds - args.budget_ms:.1f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
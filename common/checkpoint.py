@@ -0,0 +1,192 @@
+"""
+This module records the completed work units of long-running jobs so they can be resumed.
+
+Completed units are kept in memory and appended to a journal file in batches, either every
+flush_every units or every flush_interval seconds. Each batch is written with a single
+write call and synced to disk; a line cut short by a crash is ignored when the journal is
+loaded, so the journal never holds a partially recorded unit. A before_flush callback can
+make the outputs of the units durable first, so the journal never records a unit whose
+output could still be lost.
+
+sync_files makes loose output files durable, for jobs whose outputs are not written
+through a writer with its own flush.
+
+A job can also save a state next to the journal, such as a plan computed before the units
+are processed, so a resumed run does not compute it again.
+"""
+
+import json
+import os
+import time
+
+def sync_files(paths):
+    """
+    Write files and the directory entries that name them to disk.
+
+    Args:
+        paths (iterable): Paths to the files.
+    """
+    directories = set()
+    for path in paths:
+        file_descriptor = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(file_descriptor)
+        finally:
+            os.close(file_descriptor)
+        directories.add(os.path.dirname(os.path.abspath(path)))
+    for directory in directories:
+        try:
+            file_descriptor = os.open(directory, os.O_RDONLY)
+        except OSError:
+            # Directories cannot be opened on Windows, where their entries are written with the file
+            continue
+        try:
+            os.fsync(file_descriptor)
+        finally:
+            os.close(file_descriptor)
+
+class Checkpoint:
+    """
+    Journal of completed work units.
+
+    Args:
+        journal_path (str): Path to the journal file.
+        resume (bool): Load the units completed by a previous run. Otherwise the journal is
+            started from scratch.
+        flush_every (int): Number of pending units that triggers a flush.
+        flush_interval (float): Seconds after which pending units are flushed.
+        before_flush (callable or None): Called without arguments before pending units are
+            written to the journal, for example to flush the files they were written to.
+    """
+
+    def __init__(self, journal_path, resume=False, flush_every=1000, flush_interval=5.0, before_flush=None):
+        start_time = time.perf_counter()
+        self.journal_path = journal_path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.before_flush = before_flush
+        self.completed = set()
+        self.pending = []
+        self.last_flush = time.monotonic()
+        self.skipped = 0
+        self.state_path = journal_path + '.state.json'
+
+        directory = os.path.dirname(journal_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        if resume and os.path.exists(journal_path):
+            with open(journal_path, 'r', encoding='utf-8', newline='\n') as file:
+                for line in file:
+                    if line.endswith('\n'):
+                        self.completed.add(line[:-1])
+        else:
+            for path in (journal_path, self.state_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        self.file = open(journal_path, 'a', encoding='utf-8', newline='\n')
+        self.resumed = len(self.completed)
+        self.overhead = time.perf_counter() - start_time
+
+    def done(self, unit):
+        """
+        Check whether a unit was already completed, counting it as skipped if so.
+
+        Args:
+            unit (str): Identifier of the work unit, without line breaks.
+
+        Returns:
+            bool: True if the unit was completed before.
+        """
+        if unit in self.completed:
+            self.skipped += 1
+            return True
+        return False
+
+    def mark(self, unit):
+        """
+        Record a completed unit.
+
+        Args:
+            unit (str): Identifier of the work unit, without line breaks.
+        """
+        start_time = time.perf_counter()
+        if '\n' in unit:
+            raise ValueError(f"Work unit must not contain line breaks: {unit!r}")
+        self.completed.add(unit)
+        self.pending.append(unit)
+        if len(self.pending) >= self.flush_every or time.monotonic() - self.last_flush >= self.flush_interval:
+            self._flush()
+        self.overhead += time.perf_counter() - start_time
+
+    def _flush(self):
+        if self.pending:
+            if self.before_flush is not None:
+                self.before_flush()
+            self.file.write(''.join(f'{unit}\n' for unit in self.pending))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending = []
+        self.last_flush = time.monotonic()
+
+    def flush(self):
+        """
+        Write the pending units to the journal.
+        """
+        start_time = time.perf_counter()
+        self._flush()
+        self.overhead += time.perf_counter() - start_time
+
+    def save_state(self, state):
+        """
+        Save the state of the job next to the journal.
+
+        Args:
+            state (dict): JSON serializable state.
+        """
+        with open(self.state_path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(state, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(self.state_path + '.tmp', self.state_path)
+
+    def load_state(self):
+        """
+        Load the state saved by the run being resumed.
+
+        Returns:
+            dict or None: The saved state, or None if there is none.
+        """
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def close(self):
+        """
+        Flush the pending units and close the journal.
+        """
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def summary(self, total_seconds):
+        """
+        Describe the resumed units and the cost of checkpointing.
+
+        Args:
+            total_seconds (float): Duration of the whole job.
+
+        Returns:
+            str: Skipped units and checkpoint overhead, absolute and relative to the job.
+        """
+        fraction = self.overhead / total_seconds if total_seconds > 0 else 0.0
+        return (f'{self.skipped} completed units skipped, checkpoint overhead '
+                f'{self.overhead:.3f} s ({100 * fraction:.2f}% of {total_seconds:.1f} s)')
@@ -0,0 +1,162 @@
+"""
+This module discovers files in deep directory trees lazily with os.scandir.
+
+Files are yielded while the tree is walked, so processing can start on the first match
+instead of waiting for the full listing. An optional JSON index remembers the entries of
+every directory together with its modification time; on later runs only directories whose
+modification time changed are listed again.
+"""
+
+import fnmatch
+import json
+import os
+
+def matches(name, patterns, extensions):
+    """
+    Check a file name against glob patterns and extensions.
+
+    Hidden names are never matched, as with glob.
+
+    Args:
+        name (str): File name.
+        patterns (list): Glob patterns, any of which must match.
+        extensions (set or None): Lowercase extensions including the dot, or None for any.
+
+    Returns:
+        bool: True if the name is accepted.
+    """
+    if name.startswith('.'):
+        return False
+    if extensions is not None and os.path.splitext(name)[1].lower() not in extensions:
+        return False
+    return any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+def normalize_filters(patterns, extensions):
+    """
+    Normalize the pattern and extension filters.
+
+    Args:
+        patterns (str or list): One glob pattern or a list of them.
+        extensions (list or None): Extensions with or without a leading dot.
+
+    Returns:
+        tuple: (patterns, extensions) ready for matches().
+    """
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    if extensions is not None:
+        extensions = {extension.lower() if extension.startswith('.') else f'.{extension.lower()}'
+                      for extension in extensions}
+    return list(patterns), extensions
+
+def iter_files(directory, patterns='*', extensions=None):
+    """
+    Lazily yield the regular files of a directory tree that match the filters.
+
+    Args:
+        directory (str): Root directory of the search.
+        patterns (str or list): Glob pattern or patterns matched against file names.
+        extensions (list or None): Accepted extensions, for example ['.png', '.jpg'].
+
+    Yields:
+        str: Path to each matching file.
+    """
+    patterns, extensions = normalize_filters(patterns, extensions)
+    pending = [directory]
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as entries:
+                subdirectories = []
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(entry.path)
+                    elif entry.is_file() and matches(entry.name, patterns, extensions):
+                        yield entry.path
+        except OSError as e:
+            print(f"Cannot list directory '{current}': {e}")
+            continue
+        pending.extend(reversed(subdirectories))
+
+class FileIndex:
+    """
+    Persisted listing of a directory tree, refreshed incrementally by directory mtime.
+
+    Args:
+        index_path (str): Path to the JSON file holding the index.
+    """
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self.directories = {}
+        if os.path.exists(index_path):
+            with open(index_path, 'r') as file:
+                self.directories = json.load(file)
+        self.rescanned = 0
+        self.reused = 0
+
+    def _list(self, directory):
+        stat = os.stat(directory)
+        cached = self.directories.get(directory)
+        if cached is not None and cached['mtime_ns'] == stat.st_mtime_ns:
+            self.reused += 1
+            return cached['files'], cached['subdirectories']
+
+        files = []
+        subdirectories = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.name)
+                elif entry.is_file():
+                    files.append(entry.name)
+        files.sort()
+        subdirectories.sort()
+        self.directories[directory] = {
+            'mtime_ns': stat.st_mtime_ns,
+            'files': files,
+            'subdirectories': subdirectories,
+        }
+        self.rescanned += 1
+        return files, subdirectories
+
+    def iter_files(self, directory, patterns='*', extensions=None):
+        """
+        Lazily yield the matching files of a directory tree, using the index where it is current.
+
+        Directories that disappeared are dropped from the index. Call save() afterwards
+        to persist the refreshed index.
+
+        Args:
+            directory (str): Root directory of the search.
+            patterns (str or list): Glob pattern or patterns matched against file names.
+            extensions (list or None): Accepted extensions, for example ['.png', '.jpg'].
+
+        Yields:
+            str: Path to each matching file.
+        """
+        patterns, extensions = normalize_filters(patterns, extensions)
+        pending = [directory]
+        while pending:
+            current = pending.pop()
+            try:
+                files, subdirectories = self._list(current)
+            except OSError:
+                self.directories.pop(current, None)
+                continue
+            for name in files:
+                if matches(name, patterns, extensions):
+                    yield os.path.join(current, name)
+            pending.extend(os.path.join(current, name) for name in reversed(subdirectories))
+
+    def save(self):
+        """
+        Write the index to disk atomically.
+        """
+        directory = os.path.dirname(self.index_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary_path = f'{self.index_path}.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump(self.directories, file)
+        os.replace(temporary_path, self.index_path)
@@ -0,0 +1,219 @@
+"""
+This module prepares border-expanded foreground images once per target resolution
+and stores them in an on-disk cache of .npy files.
+
+Each cached asset is named after the SHA-1 of the source file, the expansion mode and
+the target size, so a changed source or a new resolution always produces a new entry.
+Assets are loaded memory-mapped, so the blending scripts read them without a copy.
+"""
+
+import argparse
+import hashlib
+import os
+
+import cv2 as cv
+import numpy as np
+
+BASE_SIZE = (500, 500)
+MODES = ('border', 'resize')
+
+_digests = {}
+
+def source_hash(path, chunk_size=1 << 20):
+    """
+    Compute the SHA-1 digest of a source file.
+
+    Digests are remembered per path, size and modification time, so unchanged
+    files are only read once per process.
+
+    Args:
+        path (str): Path to the source file.
+        chunk_size (int): Number of bytes read at a time.
+
+    Returns:
+        str: Hexadecimal SHA-1 digest.
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _digests:
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(chunk_size), b''):
+                sha1.update(chunk)
+        _digests[key] = sha1.hexdigest()
+    return _digests[key]
+
+def expand_to_size(image, target_size, base_size=BASE_SIZE):
+    """
+    Expand an image to a target size by replicating its borders, resampling it only once.
+
+    The result has the same geometry as expanding the image to base_size with
+    replicated borders and then resizing it to target_size, but the image is scaled
+    first and the border is added at the final resolution.
+
+    Args:
+        image (numpy array): Input image to be expanded.
+        target_size (tuple): Desired size (width, height).
+        base_size (tuple): Size (width, height) of the reference expansion.
+
+    Returns:
+        Image as numpy array of the target size with replicated borders.
+    """
+    height, width = image.shape[:2]
+    scale_x = target_size[0] / base_size[0]
+    scale_y = target_size[1] / base_size[1]
+
+    new_width = min(target_size[0], max(1, round(width * scale_x)))
+    new_height = min(target_size[1], max(1, round(height * scale_y)))
+    if (new_width, new_height) != (width, height):
+        image = cv.resize(image, (new_width, new_height))
+
+    delta_w = target_size[0] - new_width
+    delta_h = target_size[1] - new_height
+
+    top = delta_h // 2
+    bottom = delta_h - top
+    left = delta_w // 2
+    right = delta_w - left
+
+    return cv.copyMakeBorder(image, top, bottom, left, right, cv.BORDER_REPLICATE)
+
+def build_asset(image, target_size, mode='border'):
+    """
+    Build the foreground asset for a target size.
+
+    Args:
+        image (numpy array): Decoded foreground image.
+        target_size (tuple): Desired size (width, height).
+        mode (str): 'border' to expand with replicated borders, 'resize' to stretch the image.
+
+    Returns:
+        Foreground asset as numpy array.
+    """
+    if mode == 'border':
+        return expand_to_size(image, target_size)
+    if mode == 'resize':
+        return cv.resize(image, target_size)
+    raise ValueError(f"Unknown asset mode: {mode}")
+
+def asset_path(cache_directory, digest, target_size, mode='border'):
+    """
+    Build the path of a cached asset.
+
+    Args:
+        cache_directory (str): Directory holding the cached assets.
+        digest (str): SHA-1 digest of the source file.
+        target_size (tuple): Size (width, height) of the asset.
+        mode (str): Expansion mode of the asset.
+
+    Returns:
+        str: Path to the .npy file of the asset.
+    """
+    return os.path.join(cache_directory, f'{digest}_{mode}_{target_size[0]}x{target_size[1]}.npy')
+
+def load_asset(cache_directory, foreground_path, target_size, mode='border'):
+    """
+    Load a cached asset memory-mapped, without copying it into memory.
+
+    Args:
+        cache_directory (str): Directory holding the cached assets.
+        foreground_path (str): Path to the source foreground image.
+        target_size (tuple): Size (width, height) of the asset.
+        mode (str): Expansion mode of the asset.
+
+    Returns:
+        Read-only memory-mapped numpy array if the asset is cached, None otherwise.
+    """
+    path = asset_path(cache_directory, source_hash(foreground_path), target_size, mode)
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode='r')
+
+def prepare_asset(cache_directory, foreground_path, target_size, mode='border'):
+    """
+    Load a cached asset, building and storing it first if it is not cached yet.
+
+    Args:
+        cache_directory (str): Directory holding the cached assets.
+        foreground_path (str): Path to the source foreground image.
+        target_size (tuple): Size (width, height) of the asset.
+        mode (str): Expansion mode of the asset.
+
+    Returns:
+        Read-only memory-mapped numpy array, or None if the source cannot be loaded.
+    """
+    if not os.path.isfile(foreground_path):
+        print(f"File not found: {foreground_path}")
+        return None
+
+    target_size = tuple(int(value) for value in target_size)
+    asset = load_asset(cache_directory, foreground_path, target_size, mode)
+    if asset is not None:
+        return asset
+
+    image = cv.imread(foreground_path)
+    if image is None:
+        print(f"Failed to load image: {foreground_path}")
+        return None
+
+    os.makedirs(cache_directory, exist_ok=True)
+    path = asset_path(cache_directory, source_hash(foreground_path), target_size, mode)
+    temporary_path = f'{path[:-4]}.{os.getpid()}.tmp.npy'
+    np.save(temporary_path, np.ascontiguousarray(build_asset(image, target_size, mode)))
+    os.replace(temporary_path, path)
+
+    return np.load(path, mmap_mode='r')
+
+def prepare_assets(foreground_paths, target_sizes, cache_directory, mode='border'):
+    """
+    Build the cached assets of several foregrounds for several target sizes.
+
+    Args:
+        foreground_paths (list): Paths to the source foreground images.
+        target_sizes (list): Sizes (width, height) to build for each foreground.
+        cache_directory (str): Directory holding the cached assets.
+        mode (str): Expansion mode of the assets.
+
+    Returns:
+        int: Number of assets available in the cache.
+    """
+    prepared = 0
+    for foreground_path in foreground_paths:
+        for target_size in target_sizes:
+            if prepare_asset(cache_directory, foreground_path, target_size, mode) is not None:
+                prepared += 1
+    print(f"{prepared} foreground assets available in '{cache_directory}'")
+    return prepared
+
+def parse_size(text):
+    """
+    Parse a size written as WIDTHxHEIGHT.
+
+    Args:
+        text (str): Size text, for example '1920x1080'.
+
+    Returns:
+        tuple: Size (width, height).
+    """
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+def main():
+    parser = argparse.ArgumentParser(description='Prepare border-expanded foreground assets.')
+    parser.add_argument('foregrounds', nargs='+', help='Foreground images or directories containing them.')
+    parser.add_argument('--sizes', nargs='+', type=parse_size, required=True, help='Target sizes as WIDTHxHEIGHT.')
+    parser.add_argument('--cache', default='foreground_cache', help='Cache directory.')
+    parser.add_argument('--mode', choices=MODES, default='border', help='Expansion mode.')
+    args = parser.parse_args()
+
+    foreground_paths = []
+    for path in args.foregrounds:
+        if os.path.isdir(path):
+            foreground_paths.extend(os.path.join(path, name) for name in sorted(os.listdir(path)))
+        else:
+            foreground_paths.append(path)
+
+    prepare_assets(foreground_paths, args.sizes, args.cache, args.mode)
+
+if __name__ == "__main__":
+    main()
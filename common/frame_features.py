@@ -0,0 +1,156 @@
+"""
+This module computes compact per-frame features when a frame is saved.
+
+For every frame, a small thumbnail and the 8x8x8 color histogram used by the histogram
+based split are stored in a compressed sidecar file next to the frame. The split can then
+read the sidecar instead of decoding the full-resolution image again. The work runs on a
+background thread so the capture loop is not slowed down.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+import numpy as np
+
+FEATURES_SUFFIX = '.features.npz'
+THUMBNAIL_SIZE = (128, 128)
+HISTOGRAM_BINS = 8
+# Frames are resized to this (width, height) before their histogram is computed, as in the split
+HISTOGRAM_SIZE = (1280, 1280)
+
+def features_path(image_path):
+    """
+    Build the path of the sidecar file of a frame.
+
+    Args:
+        image_path (str): Path to the frame.
+
+    Returns:
+        str: Path to the sidecar file.
+    """
+    return os.path.splitext(image_path)[0] + FEATURES_SUFFIX
+
+def color_histogram_bgr(pixels):
+    """
+    Compute the 8x8x8 color histogram of a BGR image.
+
+    The layout and normalization match cv2.calcHist over channels [0, 1, 2] with 8 bins
+    per channel followed by cv2.normalize, flattened.
+
+    Args:
+        pixels (numpy array): (H, W, 3) uint8 image in BGR order.
+
+    Returns:
+        numpy array: 512 float32 values with unit L2 norm.
+    """
+    shift = 8 - int(np.log2(HISTOGRAM_BINS))
+    pixels = np.asarray(pixels, dtype=np.uint8).reshape(-1, 3) >> shift
+    bins = (pixels[:, 0].astype(np.intp) * HISTOGRAM_BINS + pixels[:, 1]) * HISTOGRAM_BINS + pixels[:, 2]
+    histogram = np.bincount(bins, minlength=HISTOGRAM_BINS ** 3).astype(np.float32)
+    norm = np.linalg.norm(histogram)
+    return histogram / norm if norm > 0 else histogram
+
+def compute_features(image):
+    """
+    Compute the thumbnail and color histogram of a frame.
+
+    The histogram is computed on the frame resized to HISTOGRAM_SIZE with cv2.resize, like
+    the histograms the split computes from decoded images, so both can be compared.
+
+    Args:
+        image (PIL.Image.Image): Frame as captured.
+
+    Returns:
+        tuple: (thumbnail, histogram) where thumbnail is an RGB uint8 array and histogram is
+            the output of color_histogram_bgr.
+    """
+    import cv2
+
+    rgb = image.convert('RGB')
+    bgr = np.ascontiguousarray(np.asarray(rgb)[:, :, ::-1])
+    histogram = color_histogram_bgr(cv2.resize(bgr, HISTOGRAM_SIZE))
+    rgb.thumbnail(THUMBNAIL_SIZE)
+    return np.asarray(rgb), histogram
+
+def write_features(image_path, thumbnail, histogram):
+    """
+    Store the features of a frame in its sidecar file.
+
+    Args:
+        image_path (str): Path to the frame.
+        thumbnail (numpy array): Thumbnail as an RGB uint8 array.
+        histogram (numpy array): Color histogram of the frame.
+
+    Returns:
+        str: Path to the sidecar file.
+    """
+    path = features_path(image_path)
+    temporary_path = path[:-4] + '.tmp.npz'
+    np.savez_compressed(temporary_path, thumbnail=thumbnail, histogram=histogram,
+                        histogram_size=np.array(HISTOGRAM_SIZE))
+    os.replace(temporary_path, path)
+    return path
+
+def read_features(image_path):
+    """
+    Read the features stored for a frame.
+
+    Args:
+        image_path (str): Path to the frame.
+
+    Returns:
+        dict or None: 'thumbnail' and 'histogram' arrays, or None if the frame has no
+            sidecar file, the frame was modified after it was written or the histogram was
+            computed at another size than HISTOGRAM_SIZE.
+    """
+    path = features_path(image_path)
+    try:
+        if os.path.getmtime(path) < os.path.getmtime(image_path):
+            return None
+        with np.load(path) as data:
+            if tuple(data['histogram_size']) != HISTOGRAM_SIZE:
+                return None
+            return {'thumbnail': data['thumbnail'], 'histogram': data['histogram']}
+    except (OSError, ValueError, KeyError):
+        return None
+
+class FeatureIngest:
+    """
+    Background worker that computes and stores frame features off the capture thread.
+
+    Args:
+        workers (int): Number of worker threads.
+    """
+
+    def __init__(self, workers=1):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='feature-ingest')
+
+    def submit(self, image, image_path):
+        """
+        Queue the feature computation of a saved frame.
+
+        Args:
+            image (PIL.Image.Image): Frame as captured.
+            image_path (str): Path where the frame was saved.
+        """
+        self.executor.submit(self._ingest, image, image_path)
+
+    @staticmethod
+    def _ingest(image, image_path):
+        try:
+            thumbnail, histogram = compute_features(image)
+            write_features(image_path, thumbnail, histogram)
+        except Exception as e:
+            print(f"An error occurred while computing the features of '{image_path}': {e}")
+
+    def close(self):
+        """
+        Wait for the queued frames and stop the workers.
+        """
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,212 @@
+"""
+This module stores raw frames in pre-allocated, memory-mapped arrays that grow when full.
+
+A store is a directory holding three files:
+
+- frames.npy: (capacity, height, width) array with the frames.
+- index.npy: (capacity,) structured array with the timestamp and preset of each frame.
+- store.json: number of frames written so far.
+
+Both arrays are standard .npy files, so a store can be opened read-only with
+numpy.load(..., mmap_mode='r') and sliced without copying or decoding anything. A full store
+doubles its capacity by rewriting the shape in the .npy headers and extending the files, so
+the frames already written are never copied.
+"""
+
+import io
+import json
+import os
+
+import numpy as np
+
+INDEX_DTYPE = np.dtype([('timestamp', '<f8'), ('preset', '<i4')])
+
+class FrameStore:
+    """
+    Append-only store of fixed-size frames backed by memory-mapped .npy files.
+
+    Use FrameStore.create to allocate a new store and FrameStore.open to reopen one.
+
+    Args:
+        directory (str): Directory of the store.
+        mode (str): 'r' for read-only access, 'r+' to append frames.
+    """
+
+    def __init__(self, directory, mode='r'):
+        self.directory = directory
+        self.mode = mode
+        self.load_arrays()
+        with open(os.path.join(directory, 'store.json'), 'r') as file:
+            self.count = json.load(file)['count']
+
+    @classmethod
+    def create(cls, directory, frame_shape, capacity, dtype=np.uint16):
+        """
+        Allocate a new store.
+
+        Args:
+            directory (str): Directory of the store, created if needed.
+            frame_shape (tuple): Shape (height, width) of every frame.
+            capacity (int): Number of frames allocated up front.
+            dtype: Data type of the frames.
+
+        Returns:
+            FrameStore: Store opened for appending.
+        """
+        os.makedirs(directory, exist_ok=True)
+        frames = np.lib.format.open_memmap(os.path.join(directory, 'frames.npy'), mode='w+', dtype=dtype,
+                                           shape=(capacity, *frame_shape))
+        index = np.lib.format.open_memmap(os.path.join(directory, 'index.npy'), mode='w+', dtype=INDEX_DTYPE,
+                                          shape=(capacity,))
+        del frames, index
+        write_count(directory, 0)
+        return cls(directory, mode='r+')
+
+    @classmethod
+    def open(cls, directory, mode='r'):
+        """
+        Open an existing store.
+
+        Args:
+            directory (str): Directory of the store.
+            mode (str): 'r' for read-only access, 'r+' to append frames.
+
+        Returns:
+            FrameStore: The opened store.
+        """
+        return cls(directory, mode)
+
+    def load_arrays(self):
+        self.frames = np.load(os.path.join(self.directory, 'frames.npy'), mmap_mode=self.mode)
+        self.index = np.load(os.path.join(self.directory, 'index.npy'), mmap_mode=self.mode)
+
+    @property
+    def capacity(self):
+        return self.frames.shape[0]
+
+    def grow(self, capacity):
+        """
+        Extend the store to a larger capacity in place.
+
+        Args:
+            capacity (int): New number of frames allocated.
+        """
+        if capacity <= self.capacity:
+            return
+        self.flush()
+        # The memory maps are released before the files are resized
+        self.frames = self.index = None
+        resize_array_file(os.path.join(self.directory, 'frames.npy'), capacity)
+        resize_array_file(os.path.join(self.directory, 'index.npy'), capacity)
+        self.load_arrays()
+
+    def append(self, frame, timestamp, preset):
+        """
+        Append a frame.
+
+        Args:
+            frame (numpy array): Frame with the shape and data type of the store.
+            timestamp (float): Capture time as a POSIX timestamp.
+            preset (int): Preset the frame was taken at.
+
+        Returns:
+            int: Position of the frame in the store.
+        """
+        if self.count >= self.capacity:
+            self.grow(max(1, 2 * self.capacity))
+        position = self.count
+        self.frames[position] = frame
+        self.index[position] = (timestamp, preset)
+        self.count += 1
+        return position
+
+    def flush(self):
+        """
+        Write the frames and the frame count to disk.
+        """
+        self.frames.flush()
+        self.index.flush()
+        write_count(self.directory, self.count)
+
+    def close(self):
+        """
+        Flush the store if it is writable.
+        """
+        if self.mode != 'r':
+            self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def view(self):
+        """
+        View the frames written so far, without copying them.
+
+        Returns:
+            tuple: (frames, index) memory-mapped arrays limited to the written frames.
+        """
+        return self.frames[:self.count], self.index[:self.count]
+
+    def preset_frames(self, preset):
+        """
+        Positions of the frames taken at a preset.
+
+        Args:
+            preset (int): Preset to look for.
+
+        Returns:
+            numpy array: Positions of the frames, in capture order.
+        """
+        return np.flatnonzero(self.index['preset'][:self.count] == preset)
+
+def write_count(directory, count):
+    """
+    Atomically record the number of frames of a store.
+
+    Args:
+        directory (str): Directory of the store.
+        count (int): Number of frames written.
+    """
+    path = os.path.join(directory, 'store.json')
+    with open(path + '.tmp', 'w') as file:
+        json.dump({'count': count}, file)
+    os.replace(path + '.tmp', path)
+
+def resize_array_file(path, length):
+    """
+    Change the number of rows of a .npy file in place.
+
+    Only the shape in the header changes and the file is extended or truncated, so the
+    existing rows stay where they are. The header is padded to a fixed alignment, so the new
+    shape fits unless its text gets much longer.
+
+    Args:
+        path (str): Path to the .npy file.
+        length (int): New size of the first dimension.
+    """
+    with open(path, 'r+b') as file:
+        version = np.lib.format.read_magic(file)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+            write_header = np.lib.format.write_array_header_1_0
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+            write_header = np.lib.format.write_array_header_2_0
+        data_offset = file.tell()
+
+        shape = (length, *shape[1:])
+        header = io.BytesIO()
+        write_header(header, {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': fortran_order,
+                              'shape': shape})
+        if header.tell() != data_offset:
+            raise ValueError(f"The header of '{path}' cannot hold the shape {shape}.")
+
+        file.seek(0)
+        file.write(header.getvalue())
+        file.truncate(data_offset + int(np.prod(shape)) * dtype.itemsize)
@@ -0,0 +1,253 @@
+"""
+This module collects per-stage timings and event counters of the pipeline scripts.
+
+Stages such as HTTP requests, PTZ settling, decoding, histograms, distances, copies and
+composites are timed with Metrics.timer and events are counted with Metrics.count, usually
+on the shared `metrics` registry. The values can be exported as JSON lines or in the
+Prometheus text format.
+
+The module also sets up logging through a queue, so a log call only enqueues the record and
+the file is written by a background thread, and provides an optional cProfile hook.
+"""
+
+import atexit
+import cProfile
+from contextlib import contextmanager
+import json
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import os
+import pstats
+import queue
+import threading
+import time
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+class Metrics:
+    """
+    Thread-safe registry of stage timings and event counters.
+
+    Every stage keeps its number of calls and its total, minimum and maximum duration.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.counters = {}
+
+    @contextmanager
+    def timer(self, stage):
+        """
+        Time the enclosed block as one call of a stage.
+
+        Args:
+            stage (str): Name of the stage.
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start_time)
+
+    def observe(self, stage, seconds):
+        """
+        Record one call of a stage.
+
+        Args:
+            stage (str): Name of the stage.
+            seconds (float): Duration of the call.
+        """
+        with self.lock:
+            values = self.stages.get(stage)
+            if values is None:
+                self.stages[stage] = [1, seconds, seconds, seconds]
+            else:
+                values[0] += 1
+                values[1] += seconds
+                values[2] = min(values[2], seconds)
+                values[3] = max(values[3], seconds)
+
+    def merge(self, timings):
+        """
+        Record the stage durations measured elsewhere, for example in a worker process.
+
+        Args:
+            timings (dict): Mapping from stage name to the duration of one call.
+        """
+        for stage, seconds in timings.items():
+            self.observe(stage, seconds)
+
+    def count(self, name, value=1):
+        """
+        Increase an event counter.
+
+        Args:
+            name (str): Name of the counter.
+            value (int): Amount added to the counter.
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self):
+        """
+        Copy the values collected so far.
+
+        Returns:
+            dict: 'stages' maps each stage to its count, total, mean, min and max seconds and
+                'counters' maps each counter to its value.
+        """
+        with self.lock:
+            stages = {
+                stage: {
+                    'count': count,
+                    'total_seconds': total,
+                    'mean_seconds': total / count,
+                    'min_seconds': minimum,
+                    'max_seconds': maximum,
+                }
+                for stage, (count, total, minimum, maximum) in self.stages.items()
+            }
+            return {'stages': stages, 'counters': dict(self.counters)}
+
+    def reset(self):
+        """
+        Forget the values collected so far.
+        """
+        with self.lock:
+            self.stages = {}
+            self.counters = {}
+
+    def write_jsonl(self, path, job):
+        """
+        Append the collected values to a JSON lines file, one line per stage and counter.
+
+        Args:
+            path (str): Path to the file.
+            job (str): Name of the job, stored in every line.
+        """
+        snapshot = self.snapshot()
+        timestamp = time.time()
+        lines = [json.dumps({'time': timestamp, 'job': job, 'stage': stage, **values})
+                 for stage, values in sorted(snapshot['stages'].items())]
+        lines += [json.dumps({'time': timestamp, 'job': job, 'counter': name, 'value': value})
+                  for name, value in sorted(snapshot['counters'].items())]
+        with open(path, 'a', encoding='utf-8') as file:
+            file.write(''.join(line + '\n' for line in lines))
+
+    def write_prometheus(self, path, job):
+        """
+        Write the collected values in the Prometheus text exposition format.
+
+        The file is replaced atomically so it can be read by the node exporter textfile collector.
+
+        Args:
+            path (str): Path to the file, usually ending in .prom.
+            job (str): Name of the job, used as a label.
+        """
+        snapshot = self.snapshot()
+        lines = [
+            '# HELP pipeline_stage_seconds Time spent in each pipeline stage.',
+            '# TYPE pipeline_stage_seconds summary',
+        ]
+        for stage, values in sorted(snapshot['stages'].items()):
+            labels = f'job="{job}",stage="{stage}"'
+            lines.append(f'pipeline_stage_seconds_sum{{{labels}}} {values["total_seconds"]:.9f}')
+            lines.append(f'pipeline_stage_seconds_count{{{labels}}} {values["count"]}')
+        lines += [
+            '# HELP pipeline_stage_max_seconds Longest call of each pipeline stage.',
+            '# TYPE pipeline_stage_max_seconds gauge',
+        ]
+        for stage, values in sorted(snapshot['stages'].items()):
+            lines.append(f'pipeline_stage_max_seconds{{job="{job}",stage="{stage}"}} {values["max_seconds"]:.9f}')
+        lines += [
+            '# HELP pipeline_events_total Events counted by the pipeline.',
+            '# TYPE pipeline_events_total counter',
+        ]
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f'pipeline_events_total{{job="{job}",event="{name}"}} {value}')
+
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+        os.replace(path + '.tmp', path)
+
+    def export(self, path, job):
+        """
+        Export the collected values, in the Prometheus format for .prom files and as JSON lines otherwise.
+
+        Args:
+            path (str): Path to the file.
+            job (str): Name of the job.
+        """
+        if path.endswith('.prom'):
+            self.write_prometheus(path, job)
+        else:
+            self.write_jsonl(path, job)
+
+    def summary(self):
+        """
+        Describe the collected values.
+
+        Returns:
+            str: One line per stage and counter.
+        """
+        snapshot = self.snapshot()
+        lines = [f"{stage}: {values['count']} calls, {values['total_seconds']:.3f} s, "
+                 f"{1000 * values['mean_seconds']:.3f} ms per call"
+                 for stage, values in sorted(snapshot['stages'].items())]
+        lines += [f'{name}: {value}' for name, value in sorted(snapshot['counters'].items())]
+        return '\n'.join(lines)
+
+metrics = Metrics()
+
+def start_queue_logging(filename, level=logging.INFO, format=LOG_FORMAT):
+    """
+    Configure the root logger to write to a file through a queue.
+
+    Log calls only put the record on a queue; a background thread formats it and writes it
+    to the file. The thread is stopped, after writing the queued records, when the
+    interpreter exits.
+
+    Args:
+        filename (str): Path to the log file.
+        level (int): Logging level of the root logger.
+        format (str): Format of the log lines.
+
+    Returns:
+        QueueListener: The started listener.
+    """
+    records = queue.SimpleQueue()
+    file_handler = logging.FileHandler(filename)
+    file_handler.setFormatter(logging.Formatter(format))
+
+    listener = QueueListener(records, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root = logging.getLogger()
+    root.addHandler(QueueHandler(records))
+    root.setLevel(level)
+    return listener
+
+@contextmanager
+def profiled(output_path=None, top=25):
+    """
+    Profile the enclosed block with cProfile.
+
+    Args:
+        output_path (str or None): Path where the profile statistics are saved, readable with
+            pstats or snakeviz. Nothing is profiled if None.
+        top (int): Number of functions printed, sorted by cumulative time.
+    """
+    if output_path is None:
+        yield None
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(output_path)
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(top)
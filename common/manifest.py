@@ -0,0 +1,362 @@
+"""
+This module keeps a local SQLite manifest of the dataset images.
+
+The manifest records, for every image, its path, size, modification time, SHA-1, source
+camera and preset, label path, per-class box counts and split assignment. Capture,
+generation and split scripts update it as they go, so questions such as "which images are
+unassigned" or "which images contain class X" are indexed queries instead of directory scans.
+"""
+
+import hashlib
+import os
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    sha1 TEXT,
+    source TEXT,
+    camera TEXT,
+    preset TEXT,
+    label_path TEXT,
+    label_mtime_ns INTEGER,
+    split TEXT
+);
+CREATE TABLE IF NOT EXISTS class_counts (
+    path TEXT NOT NULL REFERENCES images(path) ON DELETE CASCADE,
+    class_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (path, class_id)
+);
+CREATE INDEX IF NOT EXISTS images_split ON images(split);
+CREATE INDEX IF NOT EXISTS images_sha1 ON images(sha1);
+CREATE INDEX IF NOT EXISTS images_preset ON images(camera, preset);
+CREATE INDEX IF NOT EXISTS class_counts_class ON class_counts(class_id);
+"""
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
+
+def file_sha1(path, chunk_size=1 << 20):
+    """
+    Compute the SHA-1 digest of a file.
+
+    Args:
+        path (str): Path to the file.
+        chunk_size (int): Number of bytes read at a time.
+
+    Returns:
+        str: Hexadecimal SHA-1 digest.
+    """
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+def count_label_classes(label_path):
+    """
+    Count the boxes of each class in a YOLO label file.
+
+    Args:
+        label_path (str): Path to the label file.
+
+    Returns:
+        dict: Mapping from class id to number of boxes.
+    """
+    counts = {}
+    with open(label_path, 'r') as file:
+        for line in file:
+            parts = line.split()
+            if parts:
+                class_id = int(float(parts[0]))
+                counts[class_id] = counts.get(class_id, 0) + 1
+    return counts
+
+def normalize_path(path):
+    """
+    Normalize a path the way it is stored in the manifest.
+
+    Args:
+        path (str): Path to normalize.
+
+    Returns:
+        str: Absolute path with forward slashes.
+    """
+    return os.path.abspath(path).replace("\\", "/")
+
+def directory_condition(directory):
+    """
+    Build the condition selecting the images stored directly in a directory.
+
+    The prefix is matched with a range on the path, which uses the primary key index and,
+    unlike LIKE, does not treat '_' or '%' in folder names as wildcards. Images in
+    subdirectories are excluded.
+
+    Args:
+        directory (str): Directory of the images.
+
+    Returns:
+        tuple: (condition, parameters) to add to a WHERE clause.
+    """
+    prefix = normalize_path(directory).rstrip('/') + '/'
+    # '0' is the character after '/', so every path starting with the prefix sorts below this bound
+    upper_bound = prefix[:-1] + '0'
+    return ("path >= ? AND path < ? AND instr(substr(path, ?), '/') = 0",
+            [prefix, upper_bound, len(prefix) + 1])
+
+class Manifest:
+    """
+    SQLite-backed manifest of dataset images.
+
+    Args:
+        database_path (str): Path to the SQLite database, created if it does not exist.
+    """
+
+    def __init__(self, database_path):
+        directory = os.path.dirname(database_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(database_path)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.executescript(SCHEMA)
+        columns = [row[1] for row in self.connection.execute('PRAGMA table_info(images)')]
+        if 'label_mtime_ns' not in columns:
+            # Manifests created before the label modification time was recorded
+            self.connection.execute('ALTER TABLE images ADD COLUMN label_mtime_ns INTEGER')
+
+    def close(self):
+        """
+        Commit pending changes and close the database.
+        """
+        self.connection.commit()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add_image(self, path, source=None, camera=None, preset=None, label_path=None, compute_hash=True,
+                  stat=None):
+        """
+        Add or refresh an image.
+
+        The hash is only recomputed when the size or modification time changed. Fields
+        passed as None keep their stored value.
+
+        Args:
+            path (str): Path to the image.
+            source (str or None): Stage that produced the image, for example 'capture'.
+            camera (str or None): Camera the image comes from.
+            preset (str or None): PTZ preset the image was taken at.
+            label_path (str or None): Path to the YOLO label of the image.
+            compute_hash (bool): Whether to store the SHA-1 of the image.
+            stat (os.stat_result or None): Status of the image if already known, for example
+                from os.scandir.
+        """
+        path = normalize_path(path)
+        if stat is None:
+            stat = os.stat(path)
+        row = self.connection.execute('SELECT size, mtime_ns, sha1 FROM images WHERE path = ?', (path,)).fetchone()
+
+        sha1 = None
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            sha1 = row[2]
+        if sha1 is None and compute_hash:
+            sha1 = file_sha1(path)
+
+        self.connection.execute(
+            """
+            INSERT INTO images (path, size, mtime_ns, sha1, source, camera, preset)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET
+                size = excluded.size,
+                mtime_ns = excluded.mtime_ns,
+                sha1 = excluded.sha1,
+                source = COALESCE(excluded.source, images.source),
+                camera = COALESCE(excluded.camera, images.camera),
+                preset = COALESCE(excluded.preset, images.preset)
+            """,
+            (path, stat.st_size, stat.st_mtime_ns, sha1, source, camera, preset),
+        )
+        if label_path is not None:
+            self.set_label(path, label_path)
+
+    def set_label(self, path, label_path, stat=None):
+        """
+        Attach a label file to an image and store its class counts.
+
+        Args:
+            path (str): Path to the image, already in the manifest.
+            label_path (str or None): Path to the YOLO label file, or None to detach the label.
+            stat (os.stat_result or None): Status of the label file if already known.
+        """
+        path = normalize_path(path)
+        self.connection.execute('DELETE FROM class_counts WHERE path = ?', (path,))
+        if label_path is None:
+            self.connection.execute('UPDATE images SET label_path = NULL, label_mtime_ns = NULL WHERE path = ?',
+                                    (path,))
+            return
+        label_path = normalize_path(label_path)
+        if stat is None:
+            stat = os.stat(label_path)
+        self.connection.execute('UPDATE images SET label_path = ?, label_mtime_ns = ? WHERE path = ?',
+                                (label_path, stat.st_mtime_ns, path))
+        self.connection.executemany(
+            'INSERT INTO class_counts (path, class_id, count) VALUES (?, ?, ?)',
+            [(path, class_id, count) for class_id, count in count_label_classes(label_path).items()],
+        )
+
+    def assign_split(self, paths, split):
+        """
+        Record the split of several images.
+
+        Args:
+            paths (list): Paths to the images.
+            split (str or None): Split name, for example 'train' or 'valid', or None to unassign.
+        """
+        self.connection.executemany('UPDATE images SET split = ? WHERE path = ?',
+                                    [(split, normalize_path(path)) for path in paths])
+        self.connection.commit()
+
+    def sync_directory(self, images_folder_path, labels_folder_path=None, source=None):
+        """
+        Add the images of a folder and pair each one with the label that has the same name.
+
+        Both folders are listed once with os.scandir and the status of every file is compared
+        with the stored one, so only new or modified images are hashed again and only new or
+        modified labels are read again. Images whose label disappeared lose it, and images
+        no longer in the folder are removed from the manifest.
+
+        Args:
+            images_folder_path (str): Folder containing the images.
+            labels_folder_path (str or None): Folder containing the YOLO labels.
+            source (str or None): Stage that produced the images.
+
+        Returns:
+            int: Number of images in the folder.
+        """
+        condition, parameters = directory_condition(images_folder_path)
+        stored = {path: (size, mtime_ns, label_path, label_mtime_ns)
+                  for path, size, mtime_ns, label_path, label_mtime_ns in self.connection.execute(
+                      'SELECT path, size, mtime_ns, label_path, label_mtime_ns FROM images WHERE ' + condition,
+                      parameters)}
+
+        labels = {}
+        if labels_folder_path is not None and os.path.isdir(labels_folder_path):
+            with os.scandir(labels_folder_path) as entries:
+                labels = {entry.name: entry for entry in entries if entry.name.endswith('.txt') and entry.is_file()}
+
+        added = 0
+        with os.scandir(images_folder_path) as entries:
+            for entry in entries:
+                if not entry.is_file() or os.path.splitext(entry.name)[1].lower() not in IMAGE_EXTENSIONS:
+                    continue
+                added += 1
+                path = normalize_path(entry.path)
+                stat = entry.stat()
+                row = stored.pop(path, None)
+                if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns or source is not None:
+                    self.add_image(path, source=source, stat=stat)
+
+                if labels_folder_path is None:
+                    continue
+                label = labels.get(os.path.splitext(entry.name)[0] + '.txt')
+                if label is None:
+                    if row is not None and row[2] is not None:
+                        self.set_label(path, None)
+                    continue
+                label_stat = label.stat()
+                if (row is None or row[2] != normalize_path(label.path)
+                        or row[3] != label_stat.st_mtime_ns):
+                    self.set_label(path, label.path, stat=label_stat)
+
+        # The stored images the listing did not see were deleted or moved
+        self.connection.executemany('DELETE FROM images WHERE path = ?', [(path,) for path in stored])
+        self.connection.commit()
+        return added
+
+    def images(self, split=None, directory=None):
+        """
+        List images, optionally restricted to a split and a directory.
+
+        Args:
+            split (str or None): Split name, None for every split.
+            directory (str or None): Only return images directly in this directory.
+
+        Returns:
+            list: Tuples (path, label_path) ordered by path.
+        """
+        query = 'SELECT path, label_path FROM images WHERE 1 = 1'
+        parameters = []
+        if split is not None:
+            query += ' AND split = ?'
+            parameters.append(split)
+        if directory is not None:
+            condition, directory_parameters = directory_condition(directory)
+            query += ' AND ' + condition
+            parameters += directory_parameters
+        return self.connection.execute(query + ' ORDER BY path', parameters).fetchall()
+
+    def unassigned(self, directory=None):
+        """
+        List the images that have no split yet.
+
+        Args:
+            directory (str or None): Only return images directly in this directory.
+
+        Returns:
+            list: Tuples (path, label_path) ordered by path.
+        """
+        query = 'SELECT path, label_path FROM images WHERE split IS NULL'
+        parameters = []
+        if directory is not None:
+            condition, directory_parameters = directory_condition(directory)
+            query += ' AND ' + condition
+            parameters += directory_parameters
+        return self.connection.execute(query + ' ORDER BY path', parameters).fetchall()
+
+    def with_class(self, class_id, split=None):
+        """
+        List the images containing at least one box of a class.
+
+        Args:
+            class_id (int): Class to look for.
+            split (str or None): Only return images of this split.
+
+        Returns:
+            list: Tuples (path, label_path, count) ordered by path.
+        """
+        query = """
+            SELECT images.path, images.label_path, class_counts.count
+            FROM class_counts JOIN images ON images.path = class_counts.path
+            WHERE class_counts.class_id = ?
+        """
+        parameters = [class_id]
+        if split is not None:
+            query += ' AND images.split = ?'
+            parameters.append(split)
+        return self.connection.execute(query + ' ORDER BY images.path', parameters).fetchall()
+
+    def remove_missing(self):
+        """
+        Remove the images whose file no longer exists.
+
+        Returns:
+            int: Number of images removed.
+        """
+        missing = [(path,) for (path,) in self.connection.execute('SELECT path FROM images')
+                   if not os.path.exists(path)]
+        self.connection.executemany('DELETE FROM images WHERE path = ?', missing)
+        self.connection.commit()
+        return len(missing)
+
+    def commit(self):
+        """
+        Commit pending changes.
+        """
+        self.connection.commit()
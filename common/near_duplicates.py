@@ -0,0 +1,215 @@
+"""
+This module detects near-duplicate frames.
+
+Frames are reduced to a small signature: a 64-bit difference hash (dHash) or a small
+grayscale thumbnail. Two frames are near-duplicates when the Hamming distance between
+their hashes, or the mean absolute difference between their thumbnails, is below a threshold.
+Large sets of hashes are searched with multi-index hashing.
+"""
+
+import numpy as np
+from PIL import Image
+
+METHODS = ('dhash', 'thumbnail')
+
+def dhash(image, hash_size=8):
+    """
+    Compute the difference hash of an image.
+
+    Args:
+        image (PIL.Image.Image): Image to hash. A JPEG that is not loaded yet is decoded at a
+            reduced scale, which changes the image in place.
+        hash_size (int): Side of the hash grid; the hash has hash_size * hash_size bits.
+
+    Returns:
+        int: Hash as an unsigned integer.
+    """
+    # draft lets the JPEG decoder skip most of the pixels; it only works on an image that
+    # was opened from a JPEG file and not loaded yet, and does nothing otherwise
+    image.draft('L', (hash_size * 4, hash_size * 4))
+    gray = image.convert('L')
+    pixels = np.asarray(gray.resize((hash_size + 1, hash_size), Image.BILINEAR), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def hamming_distance(first, second):
+    """
+    Count the bits that differ between two hashes.
+
+    Args:
+        first (int): First hash.
+        second (int): Second hash.
+
+    Returns:
+        int: Number of differing bits.
+    """
+    return (first ^ second).bit_count()
+
+def gray_thumbnail(image, size=32):
+    """
+    Compute a small grayscale thumbnail of an image.
+
+    Args:
+        image (PIL.Image.Image): Image to reduce. A JPEG that is not loaded yet is decoded at a
+            reduced scale, which changes the image in place.
+        size (int): Side of the square thumbnail.
+
+    Returns:
+        numpy array: (size, size) float32 array.
+    """
+    image.draft('L', (size * 4, size * 4))
+    gray = image.convert('L')
+    return np.asarray(gray.resize((size, size), Image.BILINEAR), dtype=np.float32)
+
+class ChangeGate:
+    """
+    Per-preset gate that suppresses frames almost identical to the last kept frame.
+
+    Args:
+        threshold (float): Frames whose distance to the last kept frame of the same preset is
+            at or below this value are near-duplicates. It is a number of differing bits for
+            'dhash' and a mean absolute gray level difference (0-255) for 'thumbnail'.
+        method (str): 'thumbnail' or 'dhash'.
+        log_only (bool): Report near-duplicates without suppressing them.
+    """
+
+    def __init__(self, threshold=2.0, method='thumbnail', log_only=False):
+        if method not in METHODS:
+            raise ValueError(f"Unknown change detection method: {method}")
+        self.threshold = threshold
+        self.method = method
+        self.log_only = log_only
+        self.last_signatures = {}
+        self.seen = 0
+        self.duplicates = 0
+        # Bytes of the suppressed frames as downloaded, not the size they would have been stored at
+        self.downloaded_bytes_skipped = 0
+
+    def signature(self, image):
+        """
+        Compute the signature of a frame for the configured method.
+
+        Args:
+            image (PIL.Image.Image): Frame.
+
+        Returns:
+            int or numpy array: Hash or thumbnail of the frame.
+        """
+        if self.method == 'dhash':
+            return dhash(image)
+        return gray_thumbnail(image)
+
+    def distance(self, first, second):
+        """
+        Distance between two signatures.
+
+        Args:
+            first: Signature of the first frame.
+            second: Signature of the second frame.
+
+        Returns:
+            float: Distance for the configured method.
+        """
+        if self.method == 'dhash':
+            return hamming_distance(first, second)
+        return float(np.abs(first - second).mean())
+
+    def check(self, preset, image, size_bytes=0):
+        """
+        Decide whether a frame must be kept.
+
+        Args:
+            preset (str): Preset the frame was taken at.
+            image (PIL.Image.Image): Frame.
+            size_bytes (int): Downloaded size of the frame, counted when it is suppressed.
+
+        Returns:
+            tuple: (keep, distance) where keep is False for a suppressed near-duplicate and
+                distance is None for the first frame of a preset.
+        """
+        self.seen += 1
+        signature = self.signature(image)
+        last_signature = self.last_signatures.get(preset)
+        distance = None if last_signature is None else self.distance(signature, last_signature)
+
+        if distance is not None and distance <= self.threshold:
+            self.duplicates += 1
+            if not self.log_only:
+                self.downloaded_bytes_skipped += size_bytes
+                return False, distance
+
+        self.last_signatures[preset] = signature
+        return True, distance
+
+    def summary(self):
+        """
+        Describe the frames suppressed so far.
+
+        Returns:
+            str: Number and fraction of near-duplicate frames and downloaded bytes skipped.
+        """
+        fraction = self.duplicates / self.seen if self.seen else 0.0
+        action = 'found' if self.log_only else 'suppressed'
+        return (f'{self.duplicates} of {self.seen} frames {action} as near-duplicates '
+                f'({100 * fraction:.1f}%), {self.downloaded_bytes_skipped} downloaded bytes not stored')
+
+class MultiIndexHash:
+    """
+    Multi-index hashing of 64-bit hashes for Hamming range queries.
+
+    The hash bits are split into max_distance + 1 chunks. Two hashes within max_distance
+    bits of each other agree exactly on at least one chunk, so only the items sharing a
+    chunk value with the query are compared, which keeps near-duplicate search far below
+    quadratic time.
+
+    Args:
+        max_distance (int): Maximum Hamming distance of the queries.
+        bits (int): Number of bits of the hashes.
+    """
+
+    def __init__(self, max_distance, bits=64):
+        self.max_distance = max_distance
+        chunks = max_distance + 1
+        edges = [round(index * bits / chunks) for index in range(chunks + 1)]
+        self.chunks = [(start, (1 << (end - start)) - 1) for start, end in zip(edges[:-1], edges[1:])]
+        self.tables = [{} for _ in self.chunks]
+        self.hashes = []
+        self.items = []
+
+    def add(self, hash_value, item):
+        """
+        Add an item.
+
+        Args:
+            hash_value (int): Hash of the item.
+            item: Value returned by queries, for example an image index.
+        """
+        position = len(self.hashes)
+        self.hashes.append(hash_value)
+        self.items.append(item)
+        for table, (shift, mask) in zip(self.tables, self.chunks):
+            table.setdefault((hash_value >> shift) & mask, []).append(position)
+
+    def query(self, hash_value, skip=None):
+        """
+        Find the items whose hash is within max_distance of a hash.
+
+        Args:
+            hash_value (int): Hash to search around.
+            skip (callable or None): Predicate called with each candidate item before its
+                distance is computed; the items for which it returns True are left out.
+
+        Returns:
+            list: (distance, item) tuples.
+        """
+        candidates = set()
+        for table, (shift, mask) in zip(self.tables, self.chunks):
+            candidates.update(table.get((hash_value >> shift) & mask, ()))
+        results = []
+        for position in candidates:
+            if skip is not None and skip(self.items[position]):
+                continue
+            distance = hamming_distance(hash_value, self.hashes[position])
+            if distance <= self.max_distance:
+                results.append((distance, self.items[position]))
+        return results
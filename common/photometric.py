@@ -0,0 +1,176 @@
+"""
+This module matches the intensity distribution of a pasted ship to the sea around it.
+
+For each background, per-tile histograms are computed once. The histogram of the local
+background around a paste location is then a sum of a few tiles, and the ship pixels are
+remapped with one 256-entry lookup table per channel, which keeps the cost per composite
+below a millisecond for ship cut-outs of a few hundred pixels.
+"""
+
+import time
+
+import numpy as np
+
+METHODS = ('histogram', 'meanstd')
+
+class BackgroundMatcher:
+    """
+    Per-background state for photometric matching.
+
+    Args:
+        background (numpy array): Background image as an (H, W) or (H, W, C) uint8 array.
+        tiles (tuple): Number of tiles (columns, rows) the background histograms are split in.
+    """
+
+    def __init__(self, background, tiles=(8, 8)):
+        background = np.asarray(background)
+        if background.ndim == 2:
+            background = background[:, :, None]
+        self.height, self.width, self.channels = background.shape
+        self.tiles_x = min(tiles[0], self.width)
+        self.tiles_y = min(tiles[1], self.height)
+        self.tile_edges_x = np.linspace(0, self.width, self.tiles_x + 1).astype(int)
+        self.tile_edges_y = np.linspace(0, self.height, self.tiles_y + 1).astype(int)
+
+        tile_x = np.searchsorted(self.tile_edges_x, np.arange(self.width), side='right') - 1
+        tile_y = np.searchsorted(self.tile_edges_y, np.arange(self.height), side='right') - 1
+        tile_ids = (tile_y[:, None] * self.tiles_x + tile_x[None, :]).ravel()
+
+        num_tiles = self.tiles_x * self.tiles_y
+        self.tile_histograms = np.empty((self.tiles_y, self.tiles_x, self.channels, 256), dtype=np.int64)
+        for channel in range(self.channels):
+            values = background[:, :, channel].ravel().astype(np.int64)
+            counts = np.bincount(tile_ids * 256 + values, minlength=num_tiles * 256)
+            self.tile_histograms[:, :, channel] = counts.reshape(self.tiles_y, self.tiles_x, 256)
+
+        self.calls = 0
+        self.seconds = 0.0
+
+    def local_histogram(self, box, margin=0.5):
+        """
+        Histogram of the background around a box.
+
+        Args:
+            box (tuple): Box (x, y, width, height) in pixels.
+            margin (float): Extra area around the box, as a fraction of its size.
+
+        Returns:
+            numpy array: (C, 256) histogram of the tiles overlapping the enlarged box.
+        """
+        x, y, width, height = box
+        x0 = max(0, int(x - width * margin))
+        y0 = max(0, int(y - height * margin))
+        x1 = min(self.width, int(x + width * (1 + margin)) + 1)
+        y1 = min(self.height, int(y + height * (1 + margin)) + 1)
+
+        first_x = max(0, np.searchsorted(self.tile_edges_x, x0, side='right') - 1)
+        first_y = max(0, np.searchsorted(self.tile_edges_y, y0, side='right') - 1)
+        last_x = max(first_x + 1, np.searchsorted(self.tile_edges_x, x1, side='left'))
+        last_y = max(first_y + 1, np.searchsorted(self.tile_edges_y, y1, side='left'))
+
+        return self.tile_histograms[first_y:last_y, first_x:last_x].sum(axis=(0, 1))
+
+    def match(self, foreground, box, mask=None, method='meanstd', strength=0.5, margin=0.5,
+              max_samples=4096):
+        """
+        Remap the foreground intensities towards the local background distribution.
+
+        Args:
+            foreground (numpy array): Foreground as an (H, W) or (H, W, C) uint8 array with the
+                same number of channels as the background.
+            box (tuple): Box (x, y, width, height) where the foreground will be pasted.
+            mask (numpy array or None): Boolean (H, W) mask of the ship pixels, None for all pixels.
+            method (str): 'histogram' for histogram matching, 'meanstd' for mean/std matching.
+            strength (float): 0 keeps the foreground unchanged, 1 applies the full matching.
+            margin (float): Extra background area around the box, as a fraction of its size.
+            max_samples (int): Approximate number of foreground pixels the source histogram is
+                computed from; larger foregrounds are sampled on a regular grid.
+
+        Returns:
+            numpy array: Matched foreground with the same shape as the input.
+        """
+        start_time = time.perf_counter()
+
+        foreground = np.asarray(foreground)
+        squeeze = foreground.ndim == 2
+        if squeeze:
+            foreground = foreground[:, :, None]
+        channels = foreground.shape[2]
+
+        step = max(1, int(np.sqrt(foreground.shape[0] * foreground.shape[1] / max_samples)))
+        pixels = foreground[::step, ::step].reshape(-1, channels)
+        if mask is not None:
+            pixels = pixels[np.asarray(mask)[::step, ::step].ravel()]
+
+        reference = self.local_histogram(box, margin)
+        if pixels.shape[0] == 0 or reference[0].sum() == 0:
+            return foreground[:, :, 0] if squeeze else foreground
+
+        source = np.stack([np.bincount(pixels[:, channel], minlength=256) for channel in range(channels)])
+        if method == 'histogram':
+            lut = histogram_lut(source, reference)
+        elif method == 'meanstd':
+            lut = mean_std_lut(source, reference)
+        else:
+            raise ValueError(f"Unknown matching method: {method}")
+
+        identity = np.arange(256, dtype=np.float64)
+        lut = np.clip(np.rint(identity + strength * (lut - identity)), 0, 255).astype(np.uint8)
+        matched = np.empty_like(foreground)
+        for channel in range(channels):
+            matched[:, :, channel] = np.take(lut[channel], foreground[:, :, channel])
+
+        self.calls += 1
+        self.seconds += time.perf_counter() - start_time
+        return matched[:, :, 0] if squeeze else matched
+
+def histogram_lut(source, reference):
+    """
+    Lookup tables that map the source histograms onto the reference histograms.
+
+    Args:
+        source (numpy array): (C, 256) source histograms.
+        reference (numpy array): (C, 256) reference histograms.
+
+    Returns:
+        numpy array: (C, 256) float lookup tables.
+    """
+    source_cdf = np.cumsum(source, axis=1) / np.maximum(source.sum(axis=1, keepdims=True), 1)
+    reference_cdf = np.cumsum(reference, axis=1) / np.maximum(reference.sum(axis=1, keepdims=True), 1)
+    lut = np.empty(source.shape, dtype=np.float64)
+    for channel in range(source.shape[0]):
+        lut[channel] = np.searchsorted(reference_cdf[channel], source_cdf[channel], side='left')
+    return np.minimum(lut, 255)
+
+def mean_std_lut(source, reference):
+    """
+    Lookup tables that give the source histograms the mean and standard deviation of the reference.
+
+    Args:
+        source (numpy array): (C, 256) source histograms.
+        reference (numpy array): (C, 256) reference histograms.
+
+    Returns:
+        numpy array: (C, 256) float lookup tables.
+    """
+    values = np.arange(256, dtype=np.float64)
+    source_mean, source_std = histogram_moments(source, values)
+    reference_mean, reference_std = histogram_moments(reference, values)
+    scale = reference_std / np.maximum(source_std, 1e-6)
+    return (values[None, :] - source_mean[:, None]) * scale[:, None] + reference_mean[:, None]
+
+def histogram_moments(histograms, values):
+    """
+    Mean and standard deviation of each histogram.
+
+    Args:
+        histograms (numpy array): (C, 256) histograms.
+        values (numpy array): Value of each bin.
+
+    Returns:
+        tuple: (mean, std) arrays of length C.
+    """
+    totals = np.maximum(histograms.sum(axis=1), 1)
+    mean = histograms @ values / totals
+    variance = histograms @ (values ** 2) / totals - mean ** 2
+    return mean, np.sqrt(np.maximum(variance, 0))
@@ -0,0 +1,181 @@
+"""
+This module streams dataset samples into size-bounded tar shards instead of loose files.
+
+Shards follow the WebDataset layout: every sample is a group of consecutive tar members
+sharing a key, one member per field (for example 'ship_001.png' and 'ship_001.txt').
+Each writer names its shards after its own writer id, so several processes can write
+into the same directory at the same time without coordination.
+"""
+
+import glob
+import io
+import os
+import tarfile
+import time
+
+DEFAULT_MAX_SHARD_BYTES = 1 << 30
+TAR_BLOCK = 512
+
+class ShardWriter:
+    """
+    Write samples into tar shards of bounded size.
+
+    Args:
+        output_directory (str): Directory where the shards are written.
+        prefix (str): Prefix of the shard file names.
+        max_shard_bytes (int): Size after which a new shard is started.
+        writer_id (str or int or None): Identifier of this writer, used in the shard
+            names. Defaults to the process id, so parallel processes never share a file.
+    """
+
+    def __init__(self, output_directory, prefix='shard', max_shard_bytes=DEFAULT_MAX_SHARD_BYTES, writer_id=None):
+        self.output_directory = output_directory
+        self.prefix = prefix
+        self.max_shard_bytes = max_shard_bytes
+        self.writer_id = os.getpid() if writer_id is None else writer_id
+        self.shard_index = 0
+        self.shard_bytes = 0
+        self.samples = 0
+        self.tar = None
+        self.shard_paths = []
+        os.makedirs(output_directory, exist_ok=True)
+
+    def _open_shard(self):
+        path = os.path.join(self.output_directory, f'{self.prefix}-{self.writer_id}-{self.shard_index:06d}.tar')
+        self.tar = tarfile.open(path, 'w')
+        self.shard_paths.append(path)
+        self.shard_index += 1
+        self.shard_bytes = 0
+
+    def write(self, key, fields):
+        """
+        Write one sample.
+
+        Args:
+            key (str): Sample key, without dots or slashes.
+            fields (dict): Mapping from extension (for example 'png' or 'txt') to the
+                field content as bytes or str.
+        """
+        if '.' in key or '/' in key:
+            raise ValueError(f"Sample key must not contain '.' or '/': {key}")
+
+        members = []
+        sample_bytes = 0
+        for extension, data in fields.items():
+            if isinstance(data, str):
+                data = data.encode('utf-8')
+            members.append((f'{key}.{extension}', data))
+            sample_bytes += TAR_BLOCK + -(-len(data) // TAR_BLOCK) * TAR_BLOCK
+
+        if self.tar is None or (self.shard_bytes and self.shard_bytes + sample_bytes > self.max_shard_bytes):
+            self.close()
+            self._open_shard()
+
+        mtime = time.time()
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = mtime
+            self.tar.addfile(info, io.BytesIO(data))
+
+        self.shard_bytes += sample_bytes
+        self.samples += 1
+
+    def flush(self):
+        """
+        Write the samples of the current shard to disk.
+
+        The shard then ends on a complete sample, so it can be read even if the writer is
+        interrupted before closing it.
+        """
+        if self.tar is not None:
+            self.tar.fileobj.flush()
+            os.fsync(self.tar.fileobj.fileno())
+
+    def close(self):
+        """
+        Close the current shard.
+        """
+        if self.tar is not None:
+            self.tar.close()
+            self.tar = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def list_shards(directory):
+    """
+    List the shards of a directory in a stable order.
+
+    Args:
+        directory (str): Directory containing .tar shards.
+
+    Returns:
+        list: Sorted paths to the shards.
+    """
+    return sorted(glob.glob(os.path.join(directory, '*.tar')))
+
+def split_member_name(name):
+    """
+    Split a tar member name into sample key and extension.
+
+    Args:
+        name (str): Member name, for example 'ship_001.png'.
+
+    Returns:
+        tuple: (key, extension).
+    """
+    directory, basename = os.path.split(name)
+    key, _, extension = basename.partition('.')
+    return os.path.join(directory, key) if directory else key, extension
+
+def iter_keys(directory):
+    """
+    Iterate over the sample keys of every shard without reading the sample data.
+
+    Args:
+        directory (str): Directory containing .tar shards.
+
+    Yields:
+        str: Sample key.
+    """
+    for path in list_shards(directory):
+        last_key = None
+        with tarfile.open(path, 'r') as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                key, _ = split_member_name(member.name)
+                if key != last_key:
+                    last_key = key
+                    yield key
+
+def iter_samples(directory):
+    """
+    Iterate over the samples of every shard of a directory.
+
+    Args:
+        directory (str): Directory containing .tar shards.
+
+    Yields:
+        tuple: (key, fields) where fields maps each extension to its content as bytes.
+    """
+    for path in list_shards(directory):
+        key = None
+        fields = {}
+        with tarfile.open(path, 'r') as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                member_key, extension = split_member_name(member.name)
+                if member_key != key:
+                    if fields:
+                        yield key, fields
+                    key = member_key
+                    fields = {}
+                fields[extension] = tar.extractfile(member).read()
+        if fields:
+            yield key, fields
@@ -0,0 +1,211 @@
+"""
+This module loads YOLO label files in bulk into columnar arrays and splits datasets by them.
+
+All the boxes of a dataset are kept in one LabelTable: one NumPy array per column (image
+index, class, x, y, w, h) instead of one Python string or list per label file, so statistics
+over millions of boxes are computed with a few vectorized operations.
+
+balanced_split assigns images to the training and validation sets so that both sets get the
+same share of every (class, box size) combination.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+class LabelTable:
+    """
+    Boxes of a set of YOLO label files, stored column by column.
+
+    Args:
+        label_paths (list): Path of the label file of every image; the position of a path is
+            the image index used in the image column.
+        image (numpy array): Image index of every box.
+        class_id (numpy array): Class of every box.
+        boxes (numpy array): (n, 4) array with the normalized x, y, w and h of every box.
+        skipped_lines (int): Number of lines that were not boxes and were ignored.
+    """
+
+    def __init__(self, label_paths, image, class_id, boxes, skipped_lines=0):
+        self.label_paths = list(label_paths)
+        self.image = image
+        self.class_id = class_id
+        self.x, self.y, self.w, self.h = (np.ascontiguousarray(column) for column in boxes.T)
+        self.skipped_lines = skipped_lines
+
+    def __len__(self):
+        return len(self.image)
+
+    @property
+    def image_count(self):
+        return len(self.label_paths)
+
+    @property
+    def class_count(self):
+        return int(self.class_id.max()) + 1 if len(self) else 0
+
+    def boxes_per_image(self):
+        """
+        Count the boxes of every image.
+
+        Returns:
+            numpy array: Number of boxes per image index.
+        """
+        return np.bincount(self.image, minlength=self.image_count)
+
+    def size_bins(self, bins=3):
+        """
+        Assign every box to a size bin by the square root of its normalized area.
+
+        The bin edges are quantiles of all the boxes, so the bins hold about the same number of boxes.
+
+        Args:
+            bins (int): Number of size bins.
+
+        Returns:
+            numpy array: Size bin of every box, from 0 (smallest) to bins - 1.
+        """
+        if not len(self):
+            return np.zeros(0, dtype=np.intp)
+        size = np.sqrt(self.w * self.h)
+        edges = np.quantile(size, np.linspace(0, 1, bins + 1)[1:-1])
+        return np.searchsorted(edges, size, side='right')
+
+def read_label(label_path):
+    """
+    Read a label file.
+
+    Args:
+        label_path (str): Path to the label file.
+
+    Returns:
+        str: Content of the file, empty if it does not exist since the image has no boxes.
+    """
+    try:
+        with open(label_path, 'r') as file:
+            return file.read()
+    except OSError:
+        return ''
+
+def load_labels(label_paths, workers=8):
+    """
+    Load YOLO label files into a LabelTable.
+
+    Files are read by a pool of threads and all their values are converted to numbers in a
+    single NumPy call. Lines that do not have exactly five values, such as segmentation
+    polygons, are ignored and counted in skipped_lines.
+
+    Args:
+        label_paths (list): Path of the label file of every image.
+        workers (int): Number of threads reading the files.
+
+    Returns:
+        LabelTable: The boxes of all the files.
+    """
+    label_paths = list(label_paths)
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            texts = list(executor.map(read_label, label_paths))
+    else:
+        texts = [read_label(label_path) for label_path in label_paths]
+
+    tokens = []
+    rows = np.zeros(len(label_paths), dtype=np.intp)
+    skipped_lines = 0
+    for index, text in enumerate(texts):
+        # Every line is checked on its own: a file whose token count is a multiple of five
+        # can still mix lines of four and six values
+        for line in text.splitlines():
+            fields = line.split()
+            if len(fields) == 5:
+                tokens.extend(fields)
+                rows[index] += 1
+            elif fields:
+                skipped_lines += 1
+
+    values = np.array(tokens, dtype=np.float64).reshape(-1, 5)
+    image = np.repeat(np.arange(len(label_paths), dtype=np.int32), rows)
+    return LabelTable(label_paths, image, values[:, 0].astype(np.int32), values[:, 1:].astype(np.float32),
+                      skipped_lines)
+
+def balanced_split(table, train_fraction=0.7, size_bins=3, groups=None, seed=0):
+    """
+    Split the images of a LabelTable so that every (class, box size) combination is shared alike.
+
+    Each image, or each group of images, is put in a stratum given by the rarest
+    (class, size bin) combination among its boxes and by its number of boxes. Images without
+    boxes form their own strata. Within every stratum, in random order, exactly the training
+    fraction of the images is assigned to training, up to one image, with systematic sampling.
+    Everything is computed with sorts and bincounts, so the cost grows with n log n in the
+    number of boxes.
+
+    Args:
+        table (LabelTable): Labels of the images.
+        train_fraction (float): Fraction of the images assigned to training.
+        size_bins (int): Number of box size bins.
+        groups (list or None): Group of every image, for example the representative of its
+            near-duplicate group; the images of a group are assigned together.
+        seed (int): Seed of the random order within the strata.
+
+    Returns:
+        numpy array: Boolean mask over the images, True for the training set.
+    """
+    if groups is None:
+        units = np.arange(table.image_count)
+    else:
+        _, units = np.unique(np.asarray(groups), return_inverse=True)
+        units = units.ravel()
+    unit_count = int(units.max()) + 1 if len(units) else 0
+    box_units = units[table.image]
+
+    combinations = table.class_count * size_bins
+    combination = table.class_id.astype(np.intp) * size_bins + table.size_bins(size_bins)
+    totals = np.bincount(combination, minlength=combinations)
+
+    # Rarest combination of every unit: the first box of the unit once sorted by rarity
+    rarest = np.full(unit_count, combinations, dtype=np.intp)
+    order = np.lexsort((combination, totals[combination], box_units))
+    present, first = np.unique(box_units[order], return_index=True)
+    rarest[present] = combination[order][first]
+
+    boxes = np.bincount(box_units, minlength=unit_count)
+    box_bucket = np.minimum(np.log2(boxes + 1).astype(np.intp), 7)
+    stratum = rarest * 8 + box_bucket
+
+    rng = np.random.default_rng(seed)
+    unit_order = np.lexsort((rng.permutation(unit_count), stratum))
+    sorted_stratum = stratum[unit_order]
+    starts = np.flatnonzero(np.r_[True, sorted_stratum[1:] != sorted_stratum[:-1]])
+    sizes = np.diff(np.r_[starts, unit_count])
+    rank = np.arange(unit_count) - np.repeat(starts, sizes)
+    offset = np.repeat(rng.random(len(starts)), sizes)
+
+    unit_train = np.zeros(unit_count, dtype=bool)
+    unit_train[unit_order] = (np.floor((rank + 1) * train_fraction + offset)
+                              > np.floor(rank * train_fraction + offset))
+    return unit_train[units]
+
+def split_report(table, train_mask, size_bins=3):
+    """
+    Describe how the boxes of every class and size bin are shared between the sets.
+
+    Args:
+        table (LabelTable): Labels of the images.
+        train_mask (numpy array): Boolean mask over the images, True for the training set.
+        size_bins (int): Number of box size bins.
+
+    Returns:
+        str: One line per class and per size bin with the training share of its boxes.
+    """
+    train_mask = np.asarray(train_mask, dtype=bool)
+    box_train = train_mask[table.image]
+    lines = [f"Images: {int(train_mask.sum())} training, {int((~train_mask).sum())} validation, "
+             f"{len(table)} boxes"]
+    for name, column, count in (('Class', table.class_id, table.class_count),
+                                ('Size bin', table.size_bins(size_bins), size_bins if len(table) else 0)):
+        total = np.bincount(column, minlength=count)
+        train = np.bincount(column, weights=box_train, minlength=count)
+        for value in np.flatnonzero(total):
+            lines.append(f"{name} {value}: {int(total[value])} boxes, "
+                         f"{100 * train[value] / total[value]:.1f}% in training")
+    return '\n'.join(lines)
@@ -1,22 +1,31 @@
+import argparse
 import os
+import sys
+import time
 
-def modify_to_class_boat(folder_path):
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.checkpoint import Checkpoint
+from common.instrumentation import metrics
+
+def modify_to_class_boat(folder_path, checkpoint=None):
     """
     Modify all .txt files in the specified folder by changing the first value
     of each line to '0' (class boat).
 
     Args:
     folder_path (str): The path to the folder containing .txt files to be modified.
+    checkpoint (Checkpoint): Optional journal; files it records as done are skipped
+        and each modified file is recorded in it.
     """
     file_list = os.listdir(folder_path)
 
     for file_name in file_list:
         if file_name.endswith('.txt'):
             file_path = os.path.join(folder_path, file_name).replace("\\", "/")
+            if checkpoint is not None and checkpoint.done(file_path):
+                continue
             with open(file_path, 'r') as file:
                 lines = file.readlines()
-                print(file_path)
-                print(lines)
             
             if lines:
                 modified_lines = [line.strip().split() for line in lines]
@@ -26,11 +35,23 @@ def modify_to_class_boat(folder_path):
                 with open(file_path, 'w') as file:
                     for line in modified_lines:
                         file.write(' '.join(line).replace("\\", "/") + '\n')
+                metrics.count('labels_relabelled')
+
+            if checkpoint is not None:
+                checkpoint.mark(file_path)
 
-def main():
-    folder_path = "E:/Practicas/fiftyone/Datasets finales/a/labels"
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Change the class of every label to boat.')
+    parser.add_argument('folder_path', nargs='?', default="E:/Practicas/fiftyone/Datasets finales/a/labels")
+    parser.add_argument('--resume', action='store_true', help='Skip the files modified by an interrupted run.')
+    parser.add_argument('--checkpoint', default='change_to_class_boat.journal', help='Checkpoint journal path.')
+    args = parser.parse_args(argv)
 
-    modify_to_class_boat(folder_path)
+    start_time = time.perf_counter()
+    with Checkpoint(args.checkpoint, resume=args.resume) as checkpoint:
+        modify_to_class_boat(args.folder_path, checkpoint)
+    print(checkpoint.summary(time.perf_counter() - start_time))
+    print(metrics.summary())
 
     print("The .txt files in the folder have been modified.")
 
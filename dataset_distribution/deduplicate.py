@@ -0,0 +1,211 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.near_duplicates import MultiIndexHash, dhash
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
+
+def hash_image(image_path):
+    """
+    Compute the perceptual hash of an image file.
+
+    Args:
+        image_path (str): Path to the image.
+
+    Returns:
+        tuple: (image_path, hash) where hash is None if the image cannot be read.
+    """
+    try:
+        with Image.open(image_path) as image:
+            return image_path, dhash(image)
+    except (OSError, ValueError) as e:
+        print(f"Error hashing image '{image_path}': {e}")
+        return image_path, None
+
+def hash_images(image_paths, workers=None):
+    """
+    Compute the perceptual hashes of several images in parallel.
+
+    Args:
+        image_paths (list): Paths to the images.
+        workers (int or None): Number of worker processes, all CPUs if None.
+
+    Returns:
+        dict: Mapping from image path to hash, for the images that could be read.
+    """
+    with multiprocessing.Pool(workers) as pool:
+        results = pool.imap_unordered(hash_image, image_paths, chunksize=64)
+        return {image_path: hash_value for image_path, hash_value in results if hash_value is not None}
+
+def find_duplicate_groups(hashes, max_distance=4):
+    """
+    Group images whose hashes are within a Hamming distance of each other.
+
+    Groups are the connected components of the near-duplicate relation, so a chain of
+    near-duplicates always ends up in one group. Images with exactly the same hash are
+    joined first and only one of them is indexed, and candidates already in the group of
+    the query are skipped before their distance is computed.
+
+    Args:
+        hashes (dict): Mapping from image path to hash.
+        max_distance (int): Maximum Hamming distance between near-duplicates.
+
+    Returns:
+        list: Groups of image paths, each sorted, largest groups first.
+    """
+    image_paths = sorted(hashes)
+    parents = list(range(len(image_paths)))
+
+    def find(index):
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    def union(position, other):
+        root, other_root = find(position), find(other)
+        if root != other_root:
+            parents[max(root, other_root)] = min(root, other_root)
+
+    first_positions = {}
+    for position, image_path in enumerate(image_paths):
+        hash_value = hashes[image_path]
+        if hash_value in first_positions:
+            union(position, first_positions[hash_value])
+        else:
+            first_positions[hash_value] = position
+
+    index = MultiIndexHash(max_distance)
+    for hash_value, position in first_positions.items():
+        root = find(position)
+        for _, other in index.query(hash_value, skip=lambda other: find(other) == root):
+            union(position, other)
+            root = find(position)
+        index.add(hash_value, position)
+
+    groups = {}
+    for position, image_path in enumerate(image_paths):
+        groups.setdefault(find(position), []).append(image_path)
+    return sorted(groups.values(), key=lambda group: (-len(group), group[0]))
+
+def representatives(groups):
+    """
+    Map every image of a group to the first image of its group.
+
+    Args:
+        groups (list): Groups of image paths.
+
+    Returns:
+        dict: Mapping from absolute image path to the absolute path of its representative.
+    """
+    mapping = {}
+    for group in groups:
+        representative = os.path.abspath(group[0])
+        for image_path in group:
+            mapping[os.path.abspath(image_path)] = representative
+    return mapping
+
+def save_groups(groups, groups_path):
+    """
+    Save the duplicate groups with more than one image to a JSON file.
+
+    Args:
+        groups (list): Groups of image paths.
+        groups_path (str): Path to the JSON file.
+    """
+    with open(groups_path, 'w') as file:
+        json.dump([group for group in groups if len(group) > 1], file, indent=4)
+
+def load_groups(groups_path):
+    """
+    Load duplicate groups saved by save_groups.
+
+    Args:
+        groups_path (str): Path to the JSON file.
+
+    Returns:
+        dict: Mapping from absolute image path to the absolute path of its representative.
+    """
+    with open(groups_path, 'r') as file:
+        return representatives(json.load(file))
+
+def check_groups(groups, image_paths):
+    """
+    Warn when none of the images to split belongs to the loaded duplicate groups.
+
+    This happens when the groups were computed on another folder, or saved with relative
+    paths by an older version and loaded from another working directory; the split would
+    then silently treat every image as unique.
+
+    Args:
+        groups (dict): Mapping returned by load_groups.
+        image_paths (list): Paths to the images to split.
+
+    Returns:
+        bool: Whether at least one image belongs to a group, or there are no groups.
+    """
+    if groups and not any(os.path.abspath(image_path) in groups for image_path in image_paths):
+        print(f"Warning: none of the {len(image_paths)} images belongs to the {len(groups)} images of the "
+              f"near-duplicate groups, so no near-duplicates are kept together.")
+        return False
+    return True
+
+def deduplicate(images_folder_path, max_distance=4, workers=None, groups_path=None):
+    """
+    Find the near-duplicate images of a folder and report the groups found.
+
+    Args:
+        images_folder_path (str): Path to the folder containing images.
+        max_distance (int): Maximum Hamming distance between near-duplicates.
+        workers (int or None): Number of worker processes, all CPUs if None.
+        groups_path (str or None): If given, the groups are saved there for the split scripts.
+
+    Returns:
+        list: Groups of image paths, largest groups first.
+    """
+    image_paths = []
+    with os.scandir(images_folder_path) as entries:
+        for entry in entries:
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                # Absolute paths let the split scripts match the groups from any working directory
+                image_paths.append(os.path.abspath(entry.path))
+
+    start_time = time.perf_counter()
+    hashes = hash_images(image_paths, workers)
+    hash_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    groups = find_duplicate_groups(hashes, max_distance)
+    group_time = time.perf_counter() - start_time
+
+    duplicate_groups = [group for group in groups if len(group) > 1]
+    duplicates = sum(len(group) - 1 for group in duplicate_groups)
+    print(f"Hashed {len(hashes)} images in {hash_time:.2f} s.")
+    print(f"Found {len(duplicate_groups)} groups of near-duplicates ({duplicates} redundant images) in {group_time:.2f} s.")
+    if duplicate_groups:
+        print(f"Largest group: {len(duplicate_groups[0])} images, starting with '{duplicate_groups[0][0]}'.")
+
+    if groups_path is not None:
+        save_groups(groups, groups_path)
+
+    return groups
+
+def main():
+    parser = argparse.ArgumentParser(description='Group near-duplicate images before splitting.')
+    parser.add_argument('images_folder_path', help='Folder containing the images.')
+    parser.add_argument('--max-distance', type=int, default=4, help='Maximum Hamming distance between near-duplicates.')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes.')
+    parser.add_argument('--output', default='duplicate_groups.json', help='JSON file where the groups are saved.')
+    args = parser.parse_args()
+
+    deduplicate(args.images_folder_path, args.max_distance, args.workers, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,18 @@
+import argparse
 import os
+import sys
+import time
 import cv2
 import numpy as np
-from sklearn.metrics.pairwise import euclidean_distances
 import shutil
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.checkpoint import Checkpoint, sync_files
+from common.frame_features import FEATURES_SUFFIX, HISTOGRAM_SIZE, read_features
+from common.instrumentation import metrics, profiled
+from common.manifest import Manifest
+from deduplicate import check_groups, load_groups
+
 def calculate_color_histogram(image):
     """
     Calculate the color histogram of an image.
@@ -18,6 +27,39 @@ def calculate_color_histogram(image):
     hist = cv2.normalize(hist, hist).flatten() 
     return hist
 
+def euclidean_distances(features, chunk_size=1024):
+    """
+    Calculate the Euclidean distances between every pair of feature vectors.
+
+    Equivalent to sklearn.metrics.pairwise.euclidean_distances(features): the squared
+    distances are expanded as |a|^2 + |b|^2 - 2 a.b in float64, one block of rows at a time,
+    and the distance of each vector to itself is exactly zero.
+
+    Args:
+        features: (n, d) numpy array of feature vectors.
+        chunk_size: number of rows computed at once, which bounds the float64 temporaries.
+
+    Returns:
+    - distances: (n, n) numpy array, float32 for float32 features and float64 otherwise.
+    """
+    features = np.asarray(features)
+    dtype = np.float32 if features.dtype == np.float32 else np.float64
+    features = features.astype(np.float64, copy=False)
+    squared_norms = np.einsum('ij,ij->i', features, features)
+
+    distances = np.empty((features.shape[0], features.shape[0]), dtype=dtype)
+    for start in range(0, features.shape[0], chunk_size):
+        stop = min(start + chunk_size, features.shape[0])
+        block = features[start:stop] @ features.T
+        block *= -2
+        block += squared_norms[start:stop, None]
+        block += squared_norms[None, :]
+        distances[start:stop] = block
+
+    np.maximum(distances, 0, out=distances)
+    np.fill_diagonal(distances, 0)
+    return np.sqrt(distances, out=distances)
+
 def resize_image(image, target_size):
     """
     Resize an image to the specified target size.
@@ -33,53 +75,132 @@ def resize_image(image, target_size):
     return resized_image
 
     
-def distribute_images(images_folder_path, labels_folder_path):
+def list_image_label_pairs(images_folder_path, labels_folder_path, manifest=None):
     """
-    Distribute images into training and validation sets based on histogram distances.
+    List the images of a folder together with the label file of each one.
 
     Args:
         images_folder_path: path to the folder containing images.
         labels_folder_path: path to the folder containing labels.
+        manifest: optional Manifest; if given, the folder is synchronized into it and only
+            the images that have a label and no split yet are returned.
 
-    This function calculates color histograms for images, computes distances between them,
-    and then copies them into respective training and validation folders.
+    Returns:
+    - pairs: list of (image_path, label_path) tuples.
     """
-    images = []
-    labels = []
-
-    target_size = (1280, 1280)
-
-    image_names = os.listdir(images_folder_path)
-    label_names = os.listdir(labels_folder_path)
+    if manifest is not None:
+        manifest.sync_directory(images_folder_path, labels_folder_path)
+        return [(image_path, label_path) for image_path, label_path in manifest.unassigned(images_folder_path)
+                if label_path is not None]
 
+    pairs = []
     for filename in os.listdir(images_folder_path):
+        if filename.endswith(FEATURES_SUFFIX):
+            continue
         image_path = os.path.join(images_folder_path, filename)
-        image = cv2.imread(image_path)
-        try:
-            image = resize_image(image, target_size)
-        except Exception as e:
-            print(f"Error resizing image '{filename}': {e}")
-        if image is not None:
-            images.append(image)
-            label_path = os.path.join(labels_folder_path, filename.replace('.png', '.txt'))  
-            label_path = label_path.replace("\\", "/")
-            if not os.path.exists(label_path):
-                label_path = os.path.join(labels_folder_path, filename.replace('.jpg', '.txt'))  
-                label_path = label_path.replace("\\", "/")
-            with open(label_path, 'r') as file:
-                label = file.read().strip()  
-                label = label.replace("\\", "/")
-                labels.append(label)
-
-    images = np.array(images)
-    labels = np.array(labels)
-
-    images_features = np.array([calculate_color_histogram(image) for image in images])
-
-    distances = euclidean_distances(images_features)
-    sorted_indices = np.argsort(distances, axis=1)
-
-    num_total_images = len(images)
+        # Only the extension is replaced, so names such as 'a.png.jpg' or 'IMG.JPG' pair correctly
+        label_path = os.path.join(labels_folder_path, os.path.splitext(filename)[0] + '.txt')
+        label_path = label_path.replace("\\", "/")
+        pairs.append((image_path, label_path))
+    return pairs
+
+def copy_if_changed(source_path, destination_path):
+    """
+    Copy a file unless the destination already holds a copy of it.
+
+    Args:
+        source_path: path to the file to copy.
+        destination_path: path of the copy.
+
+    Returns:
+    - copied: True if the file was copied, False if an identical copy already existed.
+    """
+    if os.path.exists(destination_path):
+        source_stat = os.stat(source_path)
+        destination_stat = os.stat(destination_path)
+        if destination_stat.st_size == source_stat.st_size and destination_stat.st_mtime >= source_stat.st_mtime:
+            return False
+    shutil.copyfile(source_path, destination_path)
+    return True
+
+def collapse_duplicates(pairs, groups):
+    """
+    Keep one image of each group of near-duplicates.
+
+    Args:
+        pairs: list of (image_path, label_path) tuples.
+        groups: mapping from absolute image path to the absolute path of the representative
+            of its near-duplicate group, as returned by deduplicate.load_groups.
+
+    Returns:
+    - kept_pairs: list of (image_path, label_path) tuples, one per group.
+    - duplicates: mapping from each kept image path to the other (image_path, label_path)
+      tuples of its group.
+    """
+    check_groups(groups, [image_path for image_path, _ in pairs])
+    kept_pairs = []
+    duplicates = {}
+    kept_by_group = {}
+    for image_path, label_path in pairs:
+        absolute_path = os.path.abspath(image_path)
+        group = groups.get(absolute_path, absolute_path)
+        if group in kept_by_group:
+            duplicates[kept_by_group[group]].append((image_path, label_path))
+        else:
+            kept_by_group[group] = image_path
+            duplicates[image_path] = []
+            kept_pairs.append((image_path, label_path))
+    return kept_pairs, duplicates
+
+def plan_split(pairs, duplicates, use_features=True):
+    """
+    Choose the training and validation images based on histogram distances.
+
+    Args:
+        pairs: list of (image_path, label_path) tuples taking part in the distances.
+        duplicates: mapping from an image path to the (image_path, label_path) pairs of its
+            near-duplicates, which follow it into its split.
+        use_features: whether to read the color histograms stored at capture time next to
+            the images instead of decoding them.
+
+    Returns:
+    - split: (train_pairs, valid_pairs) lists of (image_path, label_path) tuples, or None if
+      no image could be read.
+    """
+    images_features = []
+    image_paths = []
+    label_paths = []
+
+    for image_path, label_path in pairs:
+        filename = os.path.basename(image_path)
+        features = read_features(image_path) if use_features else None
+        if features is not None:
+            histogram = features['histogram']
+            metrics.count('histograms_from_features')
+        else:
+            with metrics.timer('decode'):
+                image = cv2.imread(image_path)
+                try:
+                    image = resize_image(image, HISTOGRAM_SIZE)
+                except Exception as e:
+                    print(f"Error resizing image '{filename}': {e}")
+            with metrics.timer('histogram'):
+                histogram = calculate_color_histogram(image) if image is not None else None
+        if histogram is not None:
+            images_features.append(histogram)
+            image_paths.append(image_path)
+            label_paths.append(label_path)
+
+    if not images_features:
+        return None
+
+    images_features = np.array(images_features)
+
+    with metrics.timer('distance'):
+        distances = euclidean_distances(images_features)
+        sorted_indices = np.argsort(distances, axis=1)
+
+    num_total_images = len(images_features)
     num_train_images = int(num_total_images * 0.7)  
 
     if num_train_images < 0.7 * num_total_images:
@@ -104,6 +225,61 @@ def distribute_images(images_folder_path, labels_folder_path):
             if len(valid_indices) >= num_validation_images:
                 break
 
+    train_pairs = []
+    for idx in train_indices:
+        train_pairs.append((image_paths[idx], label_paths[idx]))
+        train_pairs.extend(duplicates.get(image_paths[idx], []))
+
+    valid_pairs = []
+    for idx in valid_indices:
+        valid_pairs.append((image_paths[idx], label_paths[idx]))
+        valid_pairs.extend(duplicates.get(image_paths[idx], []))
+
+    return train_pairs, valid_pairs
+
+def distribute_images(images_folder_path, labels_folder_path, manifest=None, use_features=True, groups=None,
+                      checkpoint=None):
+    """
+    Distribute images into training and validation sets based on histogram distances.
+
+    Args:
+        images_folder_path: path to the folder containing images.
+        labels_folder_path: path to the folder containing labels.
+        manifest: optional Manifest used to list the unassigned images and to record
+            the split of each image.
+        use_features: whether to read the color histograms stored at capture time next to
+            the images instead of decoding them.
+        groups: optional mapping of near-duplicate groups from deduplicate.load_groups. Only
+            one image per group takes part in the histogram distances, and the whole group
+            is copied to the split of that image.
+        checkpoint: optional Checkpoint; copies it records as done are skipped and each
+            completed copy is recorded in it once it is synced to disk. The planned split is saved with it, so a
+            resumed run goes straight to the copies without computing the histograms and
+            distances again.
+
+    This function calculates color histograms for images, computes distances between them,
+    and then copies them into respective training and validation folders. Each image is
+    copied together with the label file that has its own name.
+    """
+    pairs = list_image_label_pairs(images_folder_path, labels_folder_path, manifest)
+    duplicates = {}
+    if groups is not None:
+        pairs, duplicates = collapse_duplicates(pairs, groups)
+
+    split = checkpoint.load_state() if checkpoint is not None else None
+    if split is not None and sorted(split['pairs']) == sorted(list(pair) for pair in pairs):
+        print("Resuming the split planned by the interrupted run.")
+        train_pairs = [tuple(pair) for pair in split['train_pairs']]
+        valid_pairs = [tuple(pair) for pair in split['valid_pairs']]
+    else:
+        split = plan_split(pairs, duplicates, use_features)
+        if split is None:
+            print(f"No images to distribute in '{images_folder_path}'.")
+            return
+        train_pairs, valid_pairs = split
+        if checkpoint is not None:
+            checkpoint.save_state({'pairs': pairs, 'train_pairs': train_pairs, 'valid_pairs': valid_pairs})
+
     train_folder = "train_folder"
     valid_folder = "valid_folder"
     os.makedirs(train_folder, exist_ok=True)
@@ -118,39 +294,74 @@ def distribute_images(images_folder_path, labels_folder_path):
     os.makedirs(valid_images_folder, exist_ok=True)
     os.makedirs(valid_labels_folder, exist_ok=True)
 
-    for idx in train_indices:
-        image_name = image_names[idx]
-        label_name = label_names[idx]
-        
-        source_image_path = os.path.join(images_folder_path, image_name)
-        destination_image_path = os.path.join(train_images_folder, image_name)
-        shutil.copyfile(source_image_path, destination_image_path)
+    # Copies made since the last journal write, synced before it so a recorded copy is on disk
+    copied_paths = []
 
-        source_label_path = os.path.join(labels_folder_path, label_name)
-        destination_label_path = os.path.join(train_labels_folder, label_name)
-        shutil.copyfile(source_label_path, destination_label_path)
+    def sync_copies():
+        sync_files(copied_paths)
+        copied_paths.clear()
 
-    for idx in valid_indices:
-        image_name = image_names[idx]
-        label_name = label_names[idx]
-        
-        source_image_path = os.path.join(images_folder_path, image_name)
-        destination_image_path = os.path.join(valid_images_folder, image_name)
-        shutil.copyfile(source_image_path, destination_image_path)
+    if checkpoint is not None:
+        checkpoint.before_flush = sync_copies
+
+    for split_pairs, images_folder, labels_folder in ((train_pairs, train_images_folder, train_labels_folder),
+                                                       (valid_pairs, valid_images_folder, valid_labels_folder)):
+        for source_image_path, source_label_path in split_pairs:
+            destination_image_path = os.path.join(images_folder, os.path.basename(source_image_path))
+            if checkpoint is not None and checkpoint.done(destination_image_path):
+                continue
+
+            with metrics.timer('copy'):
+                copied = copy_if_changed(source_image_path, destination_image_path)
+
+                destination_label_path = os.path.join(labels_folder, os.path.basename(source_label_path))
+                copy_if_changed(source_label_path, destination_label_path)
+            metrics.count('images_copied' if copied else 'images_unchanged')
+
+            if checkpoint is not None:
+                copied_paths.append(destination_image_path)
+                if os.path.exists(destination_label_path):
+                    copied_paths.append(destination_label_path)
+                checkpoint.mark(destination_image_path)
+
+    if checkpoint is not None:
+        checkpoint.flush()
+        checkpoint.before_flush = None
+
+    if manifest is not None:
+        manifest.assign_split([image_path for image_path, _ in train_pairs], 'train')
+        manifest.assign_split([image_path for image_path, _ in valid_pairs], 'valid')
 
-        source_label_path = os.path.join(labels_folder_path, label_name)
-        destination_label_path = os.path.join(valid_labels_folder, label_name)
-        shutil.copyfile(source_label_path, destination_label_path)
+    print(f"Copied {len(train_pairs)} images and labels to the training set.")
+    print(f"Copied {len(valid_pairs)} images and labels to the validation set.")
 
-    print(f"Copied {len(train_indices)} images and labels to the training set.")
-    print(f"Copied {len(valid_indices)} images and labels to the validation set.")
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Distribute images into training and validation sets by histogram distances.')
+    parser.add_argument('images_folder_path', nargs='?', default="images_folder_path")
+    parser.add_argument('labels_folder_path', nargs='?', default="labels_folder_paths")
+    parser.add_argument('--manifest', default=None, help='SQLite manifest to read and update.')
+    parser.add_argument('--groups', default=None, help='Near-duplicate groups saved by deduplicate.py.')
+    parser.add_argument('--resume', action='store_true', help='Skip the copies completed by an interrupted run.')
+    parser.add_argument('--checkpoint', default='distribute_images.journal', help='Checkpoint journal path.')
+    parser.add_argument('--metrics', default=None, help='Export stage timings there (.prom for Prometheus, JSON lines otherwise).')
+    parser.add_argument('--profile', default=None, help='Profile the run with cProfile and save the statistics there.')
+    args = parser.parse_args(argv)
 
-def main():
-    images_folder_path = "images_folder_path"
-    labels_folder_path = "labels_folder_paths"
+    groups = load_groups(args.groups) if args.groups is not None else None
 
-    distribute_images(images_folder_path, labels_folder_path)
+    start_time = time.perf_counter()
+    with profiled(args.profile), Checkpoint(args.checkpoint, resume=args.resume) as checkpoint:
+        if args.manifest is not None:
+            with Manifest(args.manifest) as manifest:
+                distribute_images(args.images_folder_path, args.labels_folder_path, manifest, groups=groups,
+                                  checkpoint=checkpoint)
+        else:
+            distribute_images(args.images_folder_path, args.labels_folder_path, groups=groups, checkpoint=checkpoint)
+    print(checkpoint.summary(time.perf_counter() - start_time))
+    print(metrics.summary())
+    if args.metrics is not None:
+        metrics.export(args.metrics, 'distribute_images')
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,8 +1,17 @@
+import argparse
 import os
 import shutil
 import random
+import sys
 
-def split_data(source_dir, dest_dir, train_percent=0.7):
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.instrumentation import metrics, profiled
+from common.manifest import Manifest
+from common.shards import ShardWriter, iter_keys, iter_samples, list_shards
+from common.yolo_labels import balanced_split, load_labels, split_report
+from deduplicate import check_groups, load_groups
+
+def split_data(source_dir, dest_dir, train_percent=0.7, manifest=None, groups=None, balanced=False):
     """
     Split data from a source directory into training and validation sets,
     copying corresponding images and label files to destination directories.
@@ -12,6 +21,12 @@ def split_data(source_dir, dest_dir, train_percent=0.7):
         dest_dir (str): Path to the destination directory where split data will be copied.
         train_percent (float): Percentage of data to allocate for training (default: 0.7).
         valid_percent (float): Percentage of data to allocate for validation (default: 0.3).
+        manifest (Manifest): Optional manifest; if given, only images without a split are
+            distributed and the split of each image is recorded.
+        groups (dict): Optional mapping of near-duplicate groups from deduplicate.load_groups;
+            all the images of a group are allocated to the same split.
+        balanced (bool): Load all the labels and split so that both sets get the same share
+            of every class and box size, instead of splitting at random.
     """
     if not os.path.isdir(source_dir):
         print(f"Source directory '{source_dir}' does not exist.")
@@ -23,20 +38,52 @@ def split_data(source_dir, dest_dir, train_percent=0.7):
     os.makedirs(os.path.join(dest_dir, 'valid', 'images'), exist_ok=True)
     os.makedirs(os.path.join(dest_dir, 'valid', 'labels'), exist_ok=True)
 
-    image_files = [f for f in os.listdir(os.path.join(source_dir, 'images')) if f.endswith('.jpg')]
+    if manifest is not None:
+        manifest.sync_directory(os.path.join(source_dir, 'images'), os.path.join(source_dir, 'labels'))
+        image_files = [os.path.basename(path) for path, _ in manifest.unassigned(os.path.join(source_dir, 'images'))
+                       if path.endswith('.jpg')]
+    else:
+        image_files = [f for f in os.listdir(os.path.join(source_dir, 'images')) if f.endswith('.jpg')]
     
     if not image_files:
         print(f"No image files found in source directory '{source_dir}'.")
         return
 
     random.shuffle(image_files)
+    if groups is not None:
+        check_groups(groups, [os.path.join(source_dir, 'images', file) for file in image_files])
 
     num_files = len(image_files)
     num_train = int(num_files * train_percent)
     num_valid = num_files - num_train
 
-    train_files = image_files[:num_train]
-    valid_files = image_files[num_train:num_train + num_valid]
+    if balanced:
+        table = load_labels(os.path.join(source_dir, 'labels', file[:-4] + '.txt') for file in image_files)
+        units = None
+        if groups is not None:
+            units = []
+            for file in image_files:
+                image_path = os.path.abspath(os.path.join(source_dir, 'images', file))
+                units.append(groups.get(image_path, image_path))
+        train_mask = balanced_split(table, train_percent, groups=units)
+        train_files = [file for file, train in zip(image_files, train_mask) if train]
+        valid_files = [file for file, train in zip(image_files, train_mask) if not train]
+        print(split_report(table, train_mask))
+    elif groups is not None:
+        clusters = {}
+        for file in image_files:
+            image_path = os.path.abspath(os.path.join(source_dir, 'images', file))
+            clusters.setdefault(groups.get(image_path, image_path), []).append(file)
+        train_files = []
+        valid_files = []
+        for cluster in clusters.values():
+            if len(train_files) < num_train:
+                train_files.extend(cluster)
+            else:
+                valid_files.extend(cluster)
+    else:
+        train_files = image_files[:num_train]
+        valid_files = image_files[num_train:num_train + num_valid]
 
     def copy_files(files, subset):
         """
@@ -52,17 +99,84 @@ def split_data(source_dir, dest_dir, train_percent=0.7):
                 label_file = file[:-4] + '.txt'  
                 label_src = os.path.join(source_dir, 'labels', label_file).replace("\\", "/")
 
-                shutil.copy(image_src, os.path.join(dest_dir, subset, 'images', file)).replace("\\", "/")
-                shutil.copy(label_src, os.path.join(dest_dir, subset, 'labels', label_file)).replace("\\", "/")
+                with metrics.timer('copy'):
+                    shutil.copy(image_src, os.path.join(dest_dir, subset, 'images', file)).replace("\\", "/")
+                    shutil.copy(label_src, os.path.join(dest_dir, subset, 'labels', label_file)).replace("\\", "/")
+                metrics.count('images_copied')
 
     copy_files(train_files, 'train')
     copy_files(valid_files, 'valid')
 
-def main():
-    source_directory = 'source_directory'
-    destination_directory = 'destination_directory'
+    if manifest is not None:
+        manifest.assign_split([os.path.join(source_dir, 'images', file) for file in train_files], 'train')
+        manifest.assign_split([os.path.join(source_dir, 'images', file) for file in valid_files], 'valid')
+
+def split_shards(source_dir, dest_dir, train_percent=0.7):
+    """
+    Split the samples stored in tar shards into training and validation shards.
+
+    The sample keys are listed first without reading the data, then the samples are
+    streamed once and routed to 'train' and 'valid' shard directories in dest_dir. Shards
+    are split at random only: there is no manifest, duplicate grouping or class balancing.
+
+    Args:
+        source_dir (str): Path to the directory containing the .tar shards.
+        dest_dir (str): Path to the destination directory where split shards will be written.
+        train_percent (float): Percentage of data to allocate for training (default: 0.7).
+    """
+    if not list_shards(source_dir):
+        print(f"No shards found in source directory '{source_dir}'.")
+        return
+
+    keys = list(iter_keys(source_dir))
+    random.shuffle(keys)
+
+    num_train = int(len(keys) * train_percent)
+    train_keys = set(keys[:num_train])
+
+    with ShardWriter(os.path.join(dest_dir, 'train')) as train_writer, \
+            ShardWriter(os.path.join(dest_dir, 'valid')) as valid_writer:
+        for key, fields in iter_samples(source_dir):
+            if key in train_keys:
+                train_writer.write(key, fields)
+            else:
+                valid_writer.write(key, fields)
+
+    print(f"Wrote {train_writer.samples} samples to the training set.")
+    print(f"Wrote {valid_writer.samples} samples to the validation set.")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Randomly split images and labels into training and validation sets.')
+    parser.add_argument('source_directory', nargs='?', default='source_directory')
+    parser.add_argument('destination_directory', nargs='?', default='destination_directory')
+    parser.add_argument('--train-percent', type=float, default=0.7, help='Fraction of the data allocated for training.')
+    parser.add_argument('--manifest', default=None, help='SQLite manifest to read and update.')
+    parser.add_argument('--groups', default=None, help='Near-duplicate groups saved by deduplicate.py.')
+    parser.add_argument('--balanced', action='store_true', help='Balance the classes and box sizes of both sets.')
+    parser.add_argument('--metrics', default=None, help='Export stage timings there (.prom for Prometheus, JSON lines otherwise).')
+    parser.add_argument('--profile', default=None, help='Profile the run with cProfile and save the statistics there.')
+    args = parser.parse_args(argv)
+
+    shards = bool(list_shards(args.source_directory))
+    if shards and (args.manifest is not None or args.groups is not None or args.balanced):
+        parser.error('--manifest, --groups and --balanced apply to image folders, not to shards')
+
+    groups = load_groups(args.groups) if args.groups is not None else None
+
+    with profiled(args.profile):
+        if shards:
+            split_shards(args.source_directory, args.destination_directory, args.train_percent)
+        elif args.manifest is not None:
+            with Manifest(args.manifest) as manifest:
+                split_data(args.source_directory, args.destination_directory, args.train_percent, manifest=manifest,
+                           groups=groups, balanced=args.balanced)
+        else:
+            split_data(args.source_directory, args.destination_directory, args.train_percent, groups=groups,
+                       balanced=args.balanced)
 
-    split_data(source_directory, destination_directory)
+    print(metrics.summary())
+    if args.metrics is not None:
+        metrics.export(args.metrics, 'split_data')
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,18 +1,20 @@
+import argparse
 import datetime
 from enum import Enum
 import logging
 from datetime import datetime
 import time
-from onvif import ONVIFCamera
 import json
-import requests
-from PIL import Image
-import requests
 from io import BytesIO
 import os
+import sys
 import xml.etree.ElementTree as ET
+from email.parser import BytesParser
 
-logging.basicConfig(filename='prueba_thermal.txt', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.instrumentation import metrics, profiled, start_queue_logging
+
+log_filename = 'prueba_thermal.txt'
 
 # Define camera ID constants
 camera_id = 2
@@ -30,6 +32,9 @@ password_onvif = 'password_onvif'
 
 profile_token = 'profile_token'
 
+# Raw thermal frames are stored as unsigned 16-bit centikelvin (0.01 K per unit)
+thermal_frame_shape = (288, 384)
+
 class Request(Enum):
     """
     Enum class representing request status.
@@ -60,6 +65,9 @@ def create_camera():
     Returns:
         ONVIFCamera: The ONVIF camera object.
     """
+    # onvif loads zeep and the WSDL machinery, so it is only imported when a camera is needed
+    from onvif import ONVIFCamera
+
     return ONVIFCamera(ip, port, username_onvif, password_onvif, '/home/selene/etc/wsdl')
 
 
@@ -126,16 +134,20 @@ def send_request(endpoint, request_type, idPreset, data, method, aux=None):
     Returns:
         requests.Response: Response object containing the server's response to the request.
     """
+    # requests, PIL and NumPy are imported where they are used, so the CLI starts without them
+    import requests
+
     url = build_url(endpoint, request_type, idPreset, aux=aux)
     auth = requests.auth.HTTPBasicAuth(username, password)
-    if method == 'GET':
-        response = requests.get(url, auth=auth)
-    elif method == 'PUT':
-        response = requests.put(url, data=data, auth=auth)
-    elif method == 'POST':
-        response = requests.post(url, data=data, auth=auth)
-    elif method == 'DELETE':
-        response = requests.delete(url, data=data, auth=auth)
+    with metrics.timer('http'):
+        if method == 'GET':
+            response = requests.get(url, auth=auth)
+        elif method == 'PUT':
+            response = requests.put(url, data=data, auth=auth)
+        elif method == 'POST':
+            response = requests.post(url, data=data, auth=auth)
+        elif method == 'DELETE':
+            response = requests.delete(url, data=data, auth=auth)
     return response
 
 def handle_ptz_response(response, operation):
@@ -178,6 +190,8 @@ def save_image_from_object(image, full_path):
         image (PIL.Image.Image): Image object to be saved.
         full_path (str): Full path including filename where the image will be saved.
     """
+    import requests
+
     try:
         # Check if the directory exists, if not, create it
         directory = os.path.dirname(full_path)
@@ -205,29 +219,174 @@ def save_image_from_object(image, full_path):
     except Exception as e:
         print(f"An error occurred while saving the image: {e}")
 
-def save_image(directory):
+def save_image(directory, manifest=None, preset=None, ingest=None, gate=None):
     """
     Sends a request to obtain an image, opens it, and saves it locally.
 
     Args:
         directory (str): Directory path where the image will be saved.
+        manifest (Manifest or None): If given, the saved image is recorded in it.
+        preset (str or None): Name of the preset the image was taken at, stored in the manifest.
+        ingest (FeatureIngest or None): If given, a thumbnail and the color histogram of the image
+            are computed in the background and stored next to it.
+        gate (ChangeGate or None): If given, the image is not saved when it is almost identical
+            to the last image kept for the same preset.
     """    
+    from PIL import Image
+
     response = send_request('picture', Request.streaming.value, idPreset=None, data=None, method='GET')
     success = handle_ptz_response(response, f'Get Image')
-    print(response)
+    logging.debug(f'Get Image response: {response.status_code}')
     
     if not success:
         logging.error('An error occurred. Please check the configuration and try again.')
 
     # Open the image from the response content
-    image_object = Image.open(BytesIO(response.content))
+    with metrics.timer('decode'):
+        image_object = Image.open(BytesIO(response.content))
+        image_object.load()
+
+    if gate is not None:
+        keep, distance = gate.check(preset, image_object, len(response.content))
+        if distance is not None and distance <= gate.threshold:
+            logging.info(f'Near-duplicate frame for preset {preset} (distance {distance:.2f}).')
+        if not keep:
+            metrics.count('frames_suppressed')
+            return
     current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     # Define the destination path for saving the image
     destination_path = f'{directory}/{current_time}.png'
 
     # Call the save_image_from_object function to save the image locally
-    save_image_from_object(image_object, destination_path)
+    with metrics.timer('save'):
+        save_image_from_object(image_object, destination_path)
+    metrics.count('frames_captured')
+
+    if manifest is not None and os.path.exists(destination_path):
+        manifest.add_image(destination_path, source='capture', camera=str(camera_id), preset=preset)
+        manifest.commit()
+
+    if ingest is not None and os.path.exists(destination_path):
+        ingest.submit(image_object, destination_path)
+
+def parse_thermal_response(response):
+    """
+    Extracts the radiometric data from a thermometry picture response.
+
+    The response is a multipart message with a JSON description, the JPEG picture and the
+    raw temperature of every pixel, either as 32-bit floats in degrees Celsius or as 16-bit
+    values scaled by the scale and offset of the description. Both are converted to centikelvin.
+
+    Args:
+        response (requests.Response): Response to the jpegPicWithAppendData request.
+
+    Returns:
+        numpy array: (height, width) uint16 frame in centikelvin, or None if the response
+        does not contain radiometric data.
+    """
+    import numpy as np
+
+    header = f"Content-Type: {response.headers.get('Content-Type', '')}\r\n\r\n".encode()
+    message = BytesParser().parsebytes(header + response.content)
+
+    description = None
+    raw_data = None
+    for part in message.walk():
+        if part.is_multipart():
+            continue
+        content_type = part.get_content_type()
+        if content_type == 'application/json':
+            description = json.loads(part.get_payload(decode=True))['JpegPictureWithAppendData']
+        elif content_type == 'application/octet-stream':
+            raw_data = part.get_payload(decode=True)
+
+    if description is None or raw_data is None:
+        logging.error('Thermal response without radiometric data.')
+        return None
+
+    width = description['jpegPicWidth']
+    height = description['jpegPicHeight']
+    if description.get('temperatureDataLength', 4) == 2:
+        # 16-bit values are scaled temperatures: degrees Celsius = value / scale + offset
+        if 'scale' not in description or 'offset' not in description:
+            logging.error('16-bit thermal response without scale and offset.')
+            return None
+        raw = np.frombuffer(raw_data, dtype='<u2', count=width * height).reshape(height, width)
+        celsius = raw / np.float32(description['scale']) + np.float32(description['offset'])
+    else:
+        celsius = np.frombuffer(raw_data, dtype='<f4', count=width * height).reshape(height, width)
+    return np.clip(np.rint((celsius + 273.15) * 100), 0, np.iinfo(np.uint16).max).astype(np.uint16)
+
+def simulate_thermal_frame(rng=None):
+    """
+    Generates a synthetic radiometric frame with a sea background and a warm ship.
+
+    Used in place of the camera when working without access to it.
+
+    Args:
+        rng (numpy.random.Generator or None): Random generator.
+
+    Returns:
+        numpy array: (height, width) uint16 frame in centikelvin.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng() if rng is None else rng
+    height, width = thermal_frame_shape
+    rows = np.linspace(0, 1, height)[:, None]
+    kelvin = 288.0 + 2.0 * rows + rng.normal(0, 0.15, (height, width))
+
+    ship_height = rng.integers(height // 20, height // 8)
+    ship_width = rng.integers(width // 12, width // 4)
+    top = rng.integers(height // 3, height - ship_height)
+    left = rng.integers(0, width - ship_width)
+    kelvin[top:top + ship_height, left:left + ship_width] += rng.uniform(5, 25)
+
+    return np.rint(kelvin * 100).astype(np.uint16)
+
+def get_thermal_frame(simulate=False):
+    """
+    Gets one raw radiometric frame from the thermal channel.
+
+    Args:
+        simulate (bool): Generate a synthetic frame instead of querying the camera.
+
+    Returns:
+        numpy array: (height, width) uint16 frame in centikelvin, or None on error.
+    """
+    if simulate:
+        return simulate_thermal_frame()
+
+    response = send_request('thermometry/jpegPicWithAppendData?format=json', Request.thermal.value,
+                            idPreset=None, data=None, method='GET')
+    if not handle_ptz_response(response, 'Get Thermal Frame'):
+        return None
+    with metrics.timer('decode_thermal'):
+        return parse_thermal_response(response)
+
+def capture_thermal(store, idPreset, simulate=False):
+    """
+    Appends a raw radiometric frame to a memory-mapped frame store.
+
+    Args:
+        store (FrameStore): Store opened for appending.
+        idPreset (int): The ID of the preset the frame is taken at.
+        simulate (bool): Generate a synthetic frame instead of querying the camera.
+
+    Returns:
+        int or None: Position of the frame in the store, or None if no frame was stored.
+    """
+    frame = get_thermal_frame(simulate)
+    if frame is None:
+        return None
+    if frame.shape != store.frames.shape[1:]:
+        logging.error(f'Thermal frame shape {frame.shape} does not match the store shape {store.frames.shape[1:]}.')
+        return None
+    position = store.append(frame, time.time(), int(idPreset))
+    store.flush()
+    logging.info(f'Thermal frame {position} stored for preset {idPreset}.')
+    return position
 
 def get_preset_name_from_xml(response):
     """
@@ -321,7 +480,8 @@ def updata_preset_file(idPreset, status_dict):
 
     logging.info(f'The file {filename} has been updatad.')
 
-def get_image(idPreset, presetName):
+def get_image(idPreset, presetName, manifest=None, ingest=None, gate=None, thermal_store=None,
+              simulate_thermal=False):
     """
     Function to capture an image when a camera reaches a specified preset position.
 
@@ -329,6 +489,14 @@ def get_image(idPreset, presetName):
         idPreset (int or str): Identifier of the preset position to move the camera to.
         presetName (str): Name of the preset, used to locate the corresponding JSON file
                          containing stored pan-tilt coordinates.
+        manifest (Manifest or None): If given, the captured image is recorded in it.
+        ingest (FeatureIngest or None): If given, the features of the captured image are
+                         computed in the background and stored next to it.
+        gate (ChangeGate or None): If given, near-duplicates of the last image kept for the
+                         preset are not saved.
+        thermal_store (FrameStore or None): If given, the raw radiometric frame of the thermal
+                         channel is also appended to it.
+        simulate_thermal (bool): Append synthetic thermal frames instead of querying the camera.
     """
     mycam = create_camera()
     ptz_service = get_ptz_service(mycam)
@@ -342,19 +510,28 @@ def get_image(idPreset, presetName):
 
     max_attempts = 5
     attempt = 0
+    settle_start = None
 
     while attempt < max_attempts:
         time.sleep(5)  
+        if settle_start is None:
+            settle_start = time.perf_counter()
         goto(idPreset)
         status = get_status(ptz_service, profile_token)
         pan_tilt_x = status.Position.PanTilt.x
         pan_tilt_y = status.Position.PanTilt.y
+        metrics.count('ptz_attempts')
 
         if (
             pan_tilt_x == stored_pan_tilt_x and
             pan_tilt_y == stored_pan_tilt_y
         ):
-            save_image('images_position')
+            # Time from the first goto until the camera reports the stored position
+            metrics.observe('ptz_settle', time.perf_counter() - settle_start)
+            save_image('images_position', manifest=manifest, preset=presetName, ingest=ingest, gate=gate)
+
+            if thermal_store is not None:
+                capture_thermal(thermal_store, idPreset, simulate=simulate_thermal)
 
             status_dict = {
                 'x': pan_tilt_x,
@@ -408,22 +585,98 @@ def get_image(idPreset, presetName):
 
         updata_preset_file(idPreset, status_dict)
         updata_preset(1, idPreset, "Newpreset2")
+        metrics.count('ptz_failures')
 
         logging.error("Maximum attempts reached. Operation could not be completed successfully.")
 
-def main():
-
-    presets = [
-        {'presetId': 1, 'presetName': 'Preset 1'},
-        {'presetId': 2, 'presetName': 'Preset 2'},
-        {'presetId': 3, 'presetName': 'Preset 3'}
-    ]
-
-    for preset in presets:
-        presetId = preset['presetId']
-        presetName = preset['presetName']
-
-        get_image(presetId, presetName)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Capture an image at every preset of the camera.')
+    parser.add_argument('--preset', nargs=2, action='append', metavar=('ID', 'NAME'), dest='presets',
+                        help='Preset to capture, can be repeated (default: presets 1 to 3).')
+    parser.add_argument('--manifest', default=None, help='SQLite manifest where the images are recorded.')
+    parser.add_argument('--features', action='store_true', help='Store a thumbnail and color histogram next to each image.')
+    # Frames whose 32x32 grayscale thumbnail differs from the last kept frame of the same
+    # preset by at most this mean gray level are skipped
+    parser.add_argument('--duplicate-threshold', type=float, default=None,
+                        help='Skip near-duplicates of the last frame of the same preset.')
+    parser.add_argument('--duplicate-log-only', action='store_true',
+                        help='Only log near-duplicates and save every frame (threshold 2.0 unless given).')
+    parser.add_argument('--rounds', type=int, default=1,
+                        help='Number of rounds over the presets; 0 captures until interrupted.')
+    parser.add_argument('--interval', type=float, default=0.0, help='Seconds between the start of two rounds.')
+    parser.add_argument('--thermal-store', default=None, help='Frame store where raw radiometric frames are appended.')
+    parser.add_argument('--thermal-store-capacity', type=int, default=256,
+                        help='Frames allocated when the store is created; it doubles when full.')
+    parser.add_argument('--simulate-thermal', action='store_true',
+                        help='Store synthetic radiometric frames instead of querying the camera.')
+    parser.add_argument('--metrics', default=None, help='Export stage timings there (.prom for Prometheus, JSON lines otherwise).')
+    parser.add_argument('--profile', default=None, help='Profile the capture with cProfile and save the statistics there.')
+    args = parser.parse_args(argv)
+
+    from common.frame_features import FeatureIngest
+    from common.frame_store import FrameStore
+    from common.manifest import Manifest
+    from common.near_duplicates import ChangeGate
+
+    start_queue_logging(log_filename)
+
+    if args.presets is not None:
+        presets = [{'presetId': int(presetId), 'presetName': presetName} for presetId, presetName in args.presets]
+    else:
+        presets = [
+            {'presetId': 1, 'presetName': 'Preset 1'},
+            {'presetId': 2, 'presetName': 'Preset 2'},
+            {'presetId': 3, 'presetName': 'Preset 3'}
+        ]
+
+    manifest = Manifest(args.manifest) if args.manifest is not None else None
+    ingest = FeatureIngest() if args.features else None
+    gate = None
+    if args.duplicate_threshold is not None or args.duplicate_log_only:
+        threshold = args.duplicate_threshold if args.duplicate_threshold is not None else 2.0
+        gate = ChangeGate(threshold=threshold, log_only=args.duplicate_log_only)
+
+    thermal_store = None
+    if args.thermal_store is not None:
+        if os.path.exists(os.path.join(args.thermal_store, 'frames.npy')):
+            thermal_store = FrameStore.open(args.thermal_store, mode='r+')
+        else:
+            thermal_store = FrameStore.create(args.thermal_store, thermal_frame_shape, args.thermal_store_capacity)
+
+    # The duplicate gate compares each frame with the last frame kept for its preset, so it
+    # only suppresses frames from the second round on
+    with profiled(args.profile):
+        capture_round = 0
+        try:
+            while args.rounds == 0 or capture_round < args.rounds:
+                round_start = time.monotonic()
+                for preset in presets:
+                    presetId = preset['presetId']
+                    presetName = preset['presetName']
+
+                    get_image(presetId, presetName, manifest=manifest, ingest=ingest, gate=gate,
+                              thermal_store=thermal_store, simulate_thermal=args.simulate_thermal)
+
+                capture_round += 1
+                if args.rounds == 0 or capture_round < args.rounds:
+                    time.sleep(max(0.0, args.interval - (time.monotonic() - round_start)))
+        except KeyboardInterrupt:
+            logging.info(f'Capture interrupted after {capture_round} rounds.')
+
+    if thermal_store is not None:
+        thermal_store.close()
+
+    if gate is not None:
+        logging.info(gate.summary())
+
+    if ingest is not None:
+        ingest.close()
+    if manifest is not None:
+        manifest.close()
+
+    logging.info(metrics.summary())
+    if args.metrics is not None:
+        metrics.export(args.metrics, 'capture')
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -6,6 +6,11 @@ and then both images are combined with a specified opacity.
 
 import cv2 as cv
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from common.foreground_assets import prepare_asset
+from common.photometric import BackgroundMatcher
 
 def load_image(image_path):
     """
@@ -77,23 +82,47 @@ def save_image(image, save_path):
     cv.imwrite(save_path, image)
     print(f"Image saved to: {save_path}")
 
-def blending_openvc(background_path, foreground_path):
+def blending_openvc(background_path, foreground_path, cache_directory=None, sink=None, match=False):
     """
     Combine a background image with a foreground image using OpenCV's addWeighted function.
 
     Args:
         background_path (str): Background image file path.
         foreground_path (str): Foreground image file path.
+        cache_directory (str or None): Directory of the foreground asset cache. When given,
+            the resized foreground is memory-mapped from the cache instead of recomputed.
+        sink (ShardWriter or None): If given, the result is streamed into a shard instead of
+            being saved and displayed.
+        match (bool): Whether to match the foreground intensities to the background before blending.
     """
     background = load_image(background_path)
-    foreground = load_image(foreground_path)
 
-    if background is None or foreground is None:
+    if background is None:
+        exit(1)
+
+    if cache_directory is not None:
+        foreground_resized = prepare_asset(cache_directory, foreground_path, background.shape[1::-1], mode='resize')
+    else:
+        foreground = load_image(foreground_path)
+        foreground_resized = None if foreground is None else resize_image(foreground, background.shape[1], background.shape[0])
+
+    if foreground_resized is None:
         exit(1)
 
-    foreground_resized = resize_image(foreground, background.shape[1], background.shape[0])
+    if match:
+        matcher = BackgroundMatcher(background)
+        foreground_resized = matcher.match(foreground_resized, (0, 0, background.shape[1], background.shape[0]))
+        print(f"Photometric matching took {1000 * matcher.seconds:.3f} ms")
 
     blended_image = blend_images(background, foreground_resized)
+
+    if sink is not None:
+        background_name = os.path.splitext(os.path.basename(background_path))[0]
+        foreground_name = os.path.splitext(os.path.basename(foreground_path))[0]
+        key = f'{background_name}_{foreground_name}'.replace('.', '_')
+        sink.write(key, {'jpg': cv.imencode('.jpg', blended_image)[1].tobytes()})
+        return
+
     cwd = os.getcwd()
 
     filename = "blended_result.jpg"
@@ -2,11 +2,26 @@
 This script demonstrates alpha blending of a foreground image onto a background image.
 The foreground image is resized and blended with the background using user-defined alpha values,
 allowing interactive adjustment of transparency levels.
+
+It can also run headless in batch mode, blending lists of background/foreground pairs
+with an alpha schedule (a linear sweep or random values) and writing every result to disk.
 """
 
+import argparse
+import os
+import random
+import sys
+import time
+
 import cv2 as cv
 import numpy as np
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from common.foreground_assets import expand_to_size, prepare_asset
+from common.instrumentation import metrics, profiled
+from common.manifest import Manifest
+from common.shards import ShardWriter
+
 def display_image(image, window_name='Image'):
     """
     Display an image in a new window until a key is pressed.
@@ -134,19 +149,225 @@ def blend_images_with_border(background_path, foreground_path):
 
         cv.imwrite('alpha_blend_result.png', blended_image)
 
-        blended_image_display = cv.imread('alpha_blend_result.png')
-        cv.imshow("alpha blending", blended_image_display)
+        cv.imshow("alpha blending", blended_image)
         cv.waitKey(0)
 
         choice = get_choice_from_user("Enter 1 to continue blending or 0 to exit: ")
 
     cv.destroyAllWindows()
 
-def main():
-    background_path = "image1.jpg"
-    foreground_path = "image2.jpg"
+def alpha_sweep(start, stop, steps):
+    """
+    Build a linear alpha schedule.
+
+    Args:
+        start (float): First alpha value.
+        stop (float): Last alpha value (included).
+        steps (int): Number of alpha values.
+
+    Returns:
+        list: Alpha values between start and stop.
+    """
+    return [float(alpha) for alpha in np.linspace(start, stop, steps)]
+
+def alpha_random(low, high, count, seed=None):
+    """
+    Build an alpha schedule of values drawn uniformly from a range.
+
+    Args:
+        low (float): Lower bound of the range.
+        high (float): Upper bound of the range.
+        count (int): Number of alpha values.
+        seed (int or None): Seed for reproducible schedules.
+
+    Returns:
+        list: Random alpha values between low and high.
+    """
+    rng = random.Random(seed)
+    return [rng.uniform(low, high) for _ in range(count)]
+
+def read_pairs(pairs_path):
+    """
+    Read background/foreground pairs from a text file.
+
+    Each non-empty line holds a background path and a foreground path separated by a comma.
+
+    Args:
+        pairs_path (str): Path to the pairs file.
 
-    blend_images_with_border(background_path, foreground_path)
+    Returns:
+        list: List of (background_path, foreground_path) tuples.
+
+    Raises:
+        ValueError: If a line does not hold two comma-separated paths.
+    """
+    pairs = []
+    with open(pairs_path, 'r') as file:
+        for line_number, line in enumerate(file, start=1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if ',' not in line:
+                raise ValueError(f"Line {line_number} of '{pairs_path}' is not a 'background,foreground' pair: {line}")
+            background_path, foreground_path = [part.strip() for part in line.split(',', 1)]
+            pairs.append((background_path, foreground_path))
+    return pairs
+
+def blend_batch(pairs, alphas, output_directory, cache_directory=None, sink=None, manifest=None):
+    """
+    Blend every background/foreground pair with every alpha value without any display window.
+
+    Each foreground is expanded once per background size and reused for every alpha.
+    With a cache directory, the expanded foregrounds are stored on disk and memory-mapped
+    on later runs instead of being recomputed.
+
+    Output names start with the index of the pair and the index of the alpha in the
+    schedule, so no two outputs share a name even when inputs share a file name or alphas
+    round to the same value; the rounded alpha only follows as information.
+
+    Args:
+        pairs (list): List of (background_path, foreground_path) tuples.
+        alphas (list): Alpha values applied to each pair.
+        output_directory (str): Directory where the blended images will be saved.
+        cache_directory (str or None): Directory of the foreground asset cache.
+        sink (ShardWriter or None): If given, results are streamed into shards instead of
+            being saved as loose files in output_directory.
+        manifest (Manifest or None): If given, every image saved to output_directory is recorded in it.
+
+    Returns:
+        int: Number of blended images written.
+
+    Raises:
+        ValueError: If an alpha value is not between 0 and 1.
+    """
+    invalid = [alpha for alpha in alphas if not 0.0 <= alpha <= 1.0]
+    if invalid:
+        raise ValueError(f"Alpha values must be between 0.0 and 1.0, got {invalid}")
+    if sink is None:
+        os.makedirs(output_directory, exist_ok=True)
+
+    backgrounds = {}
+    foregrounds = {}
+    expanded_foregrounds = {}
+    written = 0
+    start_time = time.perf_counter()
+
+    for pair_index, (background_path, foreground_path) in enumerate(pairs):
+        if background_path not in backgrounds:
+            backgrounds[background_path] = load_image(background_path)
+        background = backgrounds[background_path]
+
+        if background is None:
+            print(f"Skipping pair: {background_path}, {foreground_path}")
+            continue
+
+        target_size = background.shape[1::-1]
+        expanded_key = (foreground_path, target_size)
+        if expanded_key not in expanded_foregrounds:
+            if cache_directory is not None:
+                expanded_foregrounds[expanded_key] = prepare_asset(cache_directory, foreground_path, target_size)
+            else:
+                if foreground_path not in foregrounds:
+                    foregrounds[foreground_path] = load_image(foreground_path)
+                foreground = foregrounds[foreground_path]
+                expanded_foregrounds[expanded_key] = None if foreground is None else expand_to_size(foreground, target_size)
+        foreground_resized = expanded_foregrounds[expanded_key]
+
+        if foreground_resized is None:
+            print(f"Skipping pair: {background_path}, {foreground_path}")
+            continue
+
+        background_name = os.path.splitext(os.path.basename(background_path))[0]
+        foreground_name = os.path.splitext(os.path.basename(foreground_path))[0]
+
+        for alpha_index, alpha in enumerate(alphas):
+            with metrics.timer('composite'):
+                blended_image = cv.addWeighted(background, alpha, foreground_resized, 1 - alpha, 0)
+            filename = f'{pair_index:05d}_{alpha_index:04d}_{background_name}_{foreground_name}_alpha{alpha:.3f}.png'
+            if sink is not None:
+                sink.write(filename[:-4].replace('.', '_'), {'png': cv.imencode('.png', blended_image)[1].tobytes()})
+            else:
+                output_path = os.path.join(output_directory, filename)
+                with metrics.timer('save'):
+                    cv.imwrite(output_path, blended_image)
+                if manifest is not None:
+                    manifest.add_image(output_path, source='blend')
+            written += 1
+
+    if manifest is not None:
+        manifest.commit()
+
+    elapsed = time.perf_counter() - start_time
+    throughput = written / elapsed if elapsed > 0 else 0.0
+    print(f"Blended {written} images in {elapsed:.2f} s ({throughput:.1f} images/s)")
+    return written
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments.
+
+    Args:
+        argv (list or None): Arguments to parse, sys.argv[1:] if None.
+
+    Returns:
+        argparse.Namespace: Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description='Alpha blending of a foreground image onto a background image.')
+    parser.add_argument('--pairs', help='File with one "background,foreground" pair per line (enables batch mode).')
+    parser.add_argument('--output', default='alpha_blend_results', help='Output directory for batch mode.')
+    schedule = parser.add_mutually_exclusive_group()
+    schedule.add_argument('--alpha-sweep', nargs=3, type=float, metavar=('START', 'STOP', 'STEPS'),
+                          help='Linear alpha sweep.')
+    schedule.add_argument('--alpha-random', nargs=3, type=float, metavar=('LOW', 'HIGH', 'COUNT'),
+                          help='Random alpha values drawn from a range.')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for --alpha-random.')
+    parser.add_argument('--cache', default=None, help='Directory of the foreground asset cache.')
+    parser.add_argument('--shards', action='store_true', help='Write tar shards into the output directory instead of loose files.')
+    parser.add_argument('--manifest', default=None, help='SQLite manifest where the saved images are recorded.')
+    parser.add_argument('--metrics', default=None, help='Export stage timings there (.prom for Prometheus, JSON lines otherwise).')
+    parser.add_argument('--profile', default=None, help='Profile the run with cProfile and save the statistics there.')
+    args = parser.parse_args(argv)
+
+    if args.shards and args.manifest is not None:
+        parser.error('--manifest records loose files and cannot be combined with --shards')
+    schedule_range = args.alpha_sweep or args.alpha_random
+    if schedule_range is not None and not all(0.0 <= alpha <= 1.0 for alpha in schedule_range[:2]):
+        parser.error('alpha values must be between 0.0 and 1.0')
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.pairs is None:
+        background_path = "image1.jpg"
+        foreground_path = "image2.jpg"
+
+        blend_images_with_border(background_path, foreground_path)
+        return
+
+    if args.alpha_random is not None:
+        low, high, count = args.alpha_random
+        alphas = alpha_random(low, high, int(count), seed=args.seed)
+    elif args.alpha_sweep is not None:
+        start, stop, steps = args.alpha_sweep
+        alphas = alpha_sweep(start, stop, int(steps))
+    else:
+        alphas = alpha_sweep(0.0, 1.0, 11)
+
+    pairs = read_pairs(args.pairs)
+    with profiled(args.profile):
+        if args.shards:
+            with ShardWriter(args.output, prefix='alpha_blend') as sink:
+                blend_batch(pairs, alphas, args.output, cache_directory=args.cache, sink=sink)
+        else:
+            manifest = Manifest(args.manifest) if args.manifest is not None else None
+            blend_batch(pairs, alphas, args.output, cache_directory=args.cache, manifest=manifest)
+            if manifest is not None:
+                manifest.close()
+
+    print(metrics.summary())
+    if args.metrics is not None:
+        metrics.export(args.metrics, 'blend')
 
 if __name__ == "__main__":
     main()
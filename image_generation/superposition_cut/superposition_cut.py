@@ -1,38 +1,128 @@
 from PIL import Image
+import argparse
+import functools
+from io import BytesIO
+import multiprocessing
 import os
 import random
-import glob
+import sys
+import time
 
-def superposition_cut(img_ir, img_background):
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from common.checkpoint import Checkpoint, sync_files
+from common.discovery import FileIndex, iter_files
+from common.instrumentation import metrics, profiled
+from common.manifest import Manifest
+from common.photometric import BackgroundMatcher
+from common.shards import ShardWriter
+
+# Number of background matchers kept per process; each holds the histograms of one background
+MATCHER_CACHE_SIZE = 64
+
+def superposition_cut(img_ir, img_background, return_box=False, matcher=None, rng=None):
     """
     This function superimposes an infrared image onto a background image.
 
     Args:
         img_ir (Image): The infrared image to be superimposed.
         img_background (Image): The background image onto which the infrared image will be superimposed.
+        return_box (bool): Whether to also return the box where the infrared image was pasted.
+        matcher (BackgroundMatcher or None): If given, the infrared image intensities are matched
+            to the local background before pasting. It must be built from the RGB background.
+        rng (random.Random or None): Random generator for the paste position, the random module if None.
 
     Returns:
         Image: The resulting image after superimposing.
+        tuple: Box (x, y, width, height) in pixels, only if return_box is True.
     """
     img_ir = img_ir.resize((img_ir.size[0] // 2, img_ir.size[1] // 2))
 
+    if rng is None:
+        rng = random
+
     if img_ir.size[0] > img_background.size[0] or img_ir.size[1] > img_background.size[1]:
         img_ir = img_ir.resize((img_ir.size[0] // 2, img_ir.size[1] // 2))
 
     if img_background.size[0] < img_ir.size[0]:
         position_x = 0
     else:
-        position_x = random.randint(0, img_background.size[0] - img_ir.size[0])
+        position_x = rng.randint(0, img_background.size[0] - img_ir.size[0])
 
     if img_background.size[1] < img_ir.size[1]:
         position_y = 0
     else:
-        position_y = random.randint(img_background.size[1] // 3, img_background.size[1] - img_ir.size[1])
+        position_y = rng.randint(img_background.size[1] // 3, img_background.size[1] - img_ir.size[1])
+
+    if matcher is not None:
+        ir_pixels = np.asarray(img_ir.convert('RGBA'))
+        box = (position_x, position_y, img_ir.size[0], img_ir.size[1])
+        matched = matcher.match(ir_pixels[:, :, :3], box, mask=ir_pixels[:, :, 3] > 0)
+        img_ir = Image.fromarray(np.dstack([matched, ir_pixels[:, :, 3]]), 'RGBA')
 
     img_background.paste(img_ir, (position_x, position_y), img_ir)
-    
+
+    if return_box:
+        return img_background, (position_x, position_y, img_ir.size[0], img_ir.size[1])
     return img_background
 
+def yolo_box(box, image_size):
+    """
+    This function converts a pixel box into normalized YOLO coordinates.
+
+    Args:
+        box (tuple): Box (x, y, width, height) in pixels.
+        image_size (tuple): Size (width, height) of the image containing the box.
+
+    Returns:
+        tuple: (x_center, y_center, width, height) normalized to the image size.
+    """
+    x, y, width, height = box
+    image_width, image_height = image_size
+    width = min(width, image_width - x)
+    height = min(height, image_height - y)
+    return ((x + width / 2) / image_width, (y + height / 2) / image_height,
+            width / image_width, height / image_height)
+
+def yolo_label(box, image_size, class_id=0):
+    """
+    This function converts a pixel box into a YOLO label line.
+
+    Args:
+        box (tuple): Box (x, y, width, height) in pixels.
+        image_size (tuple): Size (width, height) of the image containing the box.
+        class_id (int): Class of the object (0 is boat).
+
+    Returns:
+        str: Label line 'class x_center y_center width height' with normalized values.
+    """
+    x_center, y_center, width, height = yolo_box(box, image_size)
+    return f'{class_id} {x_center:.6f} {y_center:.6f} {width:.6f} {height:.6f}'
+
+def iter_ir_images(directory, search_pattern='*ir*', extensions=None, index_path=None):
+    """
+    This function lazily yields infrared images from the specified directory as the tree is walked.
+
+    Args:
+        directory (str): Path to the directory to search for infrared images.
+        search_pattern (str or list): The pattern or patterns to search for infrared images.
+        extensions (list or None): Accepted file extensions, or None for any.
+        index_path (str or None): Path to a persisted file index refreshed by directory mtime.
+
+    Yields:
+        str: Path to each infrared image.
+    """
+    if index_path is None:
+        yield from iter_files(directory, search_pattern, extensions)
+        return
+
+    index = FileIndex(index_path)
+    try:
+        yield from index.iter_files(directory, search_pattern, extensions)
+    finally:
+        index.save()
+
 def get_ir_images(directory, search_pattern='*ir*'):
     """
     This function retrieves infrared images from the specified directory.
@@ -44,48 +134,214 @@ def get_ir_images(directory, search_pattern='*ir*'):
     Returns:
         list: List of paths to infrared images.
     """
-    ir_images = []
-    for root, dirs, files in os.walk(directory):
-        ir_images.extend(glob.glob(os.path.join(root, search_pattern)))
-    return ir_images
+    return list(iter_ir_images(directory, search_pattern))
 
-def process_images(ir_images_directory, background_images_directory, output_directory):
+@functools.lru_cache(maxsize=MATCHER_CACHE_SIZE)
+def get_matcher(background_image_path):
+    """
+    This function returns the photometric matcher of a background, building it on first use.
+
+    The matchers of the most recently used backgrounds are cached, so memory stays bounded
+    however many backgrounds there are.
+
+    Args:
+        background_image_path (str): Path to the background image, used as cache key.
+
+    Returns:
+        BackgroundMatcher: Matcher holding the precomputed background histograms.
+    """
+    with Image.open(background_image_path) as img_background:
+        return BackgroundMatcher(np.asarray(img_background.convert('RGB')))
+
+def process_image(task):
+    """
+    This function superimposes one infrared image onto a background image.
+
+    Args:
+        task (tuple): (ir_image, background_image_path, output_directory, encode, match). When encode
+            is True the result is returned encoded instead of being saved to output_directory. When
+            match is True the infrared image is photometrically matched to the background.
+
+    Returns:
+        tuple: (ir_image, result, timings) where result is (key, fields) ready for a shard writer
+            when encode is True and the saved image path otherwise (None on error), and timings
+            maps the 'composite' and 'match' stages to the time spent in them.
+    """
+    ir_image, background_image_path, output_directory, encode, match = task
+    start_time = time.perf_counter()
+    try:
+        img_ir = Image.open(ir_image)
+        img_background = Image.open(background_image_path)
+
+        matcher = None
+        if match:
+            img_background = img_background.convert('RGB')
+            matcher = get_matcher(background_image_path)
+        seconds_before = matcher.seconds if matcher is not None else 0.0
+
+        result_image, box = superposition_cut(img_ir, img_background, return_box=True, matcher=matcher)
+        timings = {'composite': time.perf_counter() - start_time}
+        if matcher is not None:
+            timings['match'] = matcher.seconds - seconds_before
+
+        image_name = os.path.basename(ir_image)
+        if encode:
+            name, extension = os.path.splitext(image_name)
+            image_format = Image.registered_extensions().get(extension.lower())
+            if image_format is None:
+                # Files PIL can open without a known extension are stored as PNG
+                image_format, extension = 'PNG', '.png'
+            buffer = BytesIO()
+            result_image.save(buffer, format=image_format)
+            return ir_image, (f'superimposition_{name}'.replace('.', '_'), {
+                extension[1:].lower(): buffer.getvalue(),
+                'txt': yolo_label(box, result_image.size) + '\n',
+            }), timings
+
+        output_path = os.path.join(output_directory, f'superimposition_{image_name}')
+        result_image.save(output_path)
+        return ir_image, output_path, timings
+    except (ValueError, OSError) as e:
+        print(f"Error processing image {ir_image}: {e}")
+    return ir_image, None, {}
+
+def process_images(ir_images_directory, background_images_directory, output_directory, sink=None,
+                   workers=0, search_pattern='*ir*', extensions=None, index_path=None, match=False,
+                   manifest=None, checkpoint=None):
     """
     This function processes all infrared images in the specified directory by superimposing them onto random background images.
 
+    Infrared images are processed while the directory tree is still being walked. With workers,
+    the compositing runs in a pool of processes fed directly by the walk.
+
     Args:
         ir_images_directory (str): Path to the directory containing infrared images.
         background_images_directory (str): Path to the directory containing background images.
         output_directory (str): Path to the directory where the resulting images will be saved.
+        sink (ShardWriter or None): If given, each result and its YOLO label are streamed
+            into shards instead of being saved as loose files in output_directory.
+        workers (int): Number of worker processes, 0 to process in this process.
+        search_pattern (str or list): The pattern or patterns to search for infrared images.
+        extensions (list or None): Accepted file extensions, or None for any.
+        index_path (str or None): Path to a persisted file index refreshed by directory mtime.
+        match (bool): Whether to match the infrared image intensities to the local background.
+        manifest (Manifest or None): If given, every image saved to output_directory is recorded in it.
+        checkpoint (Checkpoint or None): If given, infrared images completed by a previous run are
+            skipped and every completed image is recorded. The shards or the saved images, and
+            the manifest, are synced to disk before each journal write, so a recorded image
+            never loses its output.
     """
-    ir_images = get_ir_images(ir_images_directory)
+    background_images = os.listdir(background_images_directory)
+    if not background_images:
+        print(f"No background images found in '{background_images_directory}'.")
+        return
+
+    tasks = (
+        (ir_image, os.path.join(background_images_directory, random.choice(background_images)), output_directory, sink is not None, match)
+        for ir_image in iter_ir_images(ir_images_directory, search_pattern, extensions, index_path)
+        if checkpoint is None or not checkpoint.done(ir_image)
+    )
+
+    if workers > 0:
+        pool = multiprocessing.Pool(workers, initializer=random.seed)
+        results = pool.imap_unordered(process_image, tasks, chunksize=16)
+    else:
+        pool = None
+        results = map(process_image, tasks)
+
+    # Loose images saved since the last journal write, synced before it
+    saved_paths = []
+
+    def sync_outputs():
+        if sink is not None:
+            sink.flush()
+        sync_files(saved_paths)
+        saved_paths.clear()
+        if manifest is not None:
+            manifest.commit()
+
+    if checkpoint is not None:
+        checkpoint.before_flush = sync_outputs
 
-    for ir_image in ir_images:
-        try:
-            if not os.path.isfile(ir_image):
-                print(f"The path '{ir_image}' is not a regular file.")
+    composites = 0
+    match_seconds = 0.0
+    completed = False
+    try:
+        for ir_image, result, timings in results:
+            composites += 1
+            match_seconds += timings.get('match', 0.0)
+            metrics.merge(timings)
+            if result is None:
+                metrics.count('composite_errors')
                 continue
-            
-            img_ir = Image.open(ir_image)
-            background_images = os.listdir(background_images_directory)
-            background_image = random.choice(background_images)
-            background_image_path = os.path.join(background_images_directory, background_image)
-            img_background = Image.open(background_image_path)
-
-            result_image = superposition_cut(img_ir, img_background)
-
-            image_name = os.path.basename(ir_image)
-            output_path = os.path.join(output_directory, f'superimposition_{image_name}')
-            result_image.save(output_path)
-        except ValueError as e:
-            print(f"Error processing image {ir_image}: {e}")
-
-def main():
-    ir_images_directory = 'ir_images_directory'
-    background_images_directory = 'background_images_directory'
-    output_directory = 'output_directory'
-
-    process_images(ir_images_directory, background_images_directory, output_directory)
+            if sink is not None:
+                sink.write(*result)
+            elif manifest is not None:
+                manifest.add_image(result, source='superposition_cut')
+            if checkpoint is not None:
+                if sink is None:
+                    saved_paths.append(result)
+                checkpoint.mark(ir_image)
+        completed = True
+    finally:
+        if pool is not None:
+            # On an error or an interruption the queued tasks are dropped instead of being finished
+            if completed:
+                pool.close()
+            else:
+                pool.terminate()
+            pool.join()
+        if manifest is not None:
+            manifest.commit()
+        if checkpoint is not None:
+            checkpoint.flush()
+            checkpoint.before_flush = None
+
+    if match and composites:
+        print(f"Photometric matching: {composites} composites, {1000 * match_seconds / composites:.3f} ms per composite")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Superimpose infrared images onto random background images.')
+    parser.add_argument('ir_images_directory', nargs='?', default='ir_images_directory')
+    parser.add_argument('background_images_directory', nargs='?', default='background_images_directory')
+    parser.add_argument('output_directory', nargs='?', default='output_directory')
+    parser.add_argument('--shards', action='store_true', help='Stream the results into tar shards.')
+    parser.add_argument('--workers', type=int, default=0, help='Number of worker processes.')
+    parser.add_argument('--match', action='store_true', help='Match the infrared images to the local background.')
+    parser.add_argument('--pattern', nargs='+', default=['*ir*'], dest='patterns',
+                        help='Glob patterns of the infrared image names (default: *ir*).')
+    parser.add_argument('--extensions', nargs='+', default=None,
+                        help='Accepted infrared image extensions, for example .png .jpg (default: any).')
+    parser.add_argument('--index', default=None,
+                        help='JSON file index of the infrared tree, reused for directories whose mtime did not change.')
+    parser.add_argument('--resume', action='store_true', help='Skip the images completed by an interrupted run.')
+    parser.add_argument('--checkpoint', default='superposition_cut.journal', help='Checkpoint journal path.')
+    parser.add_argument('--manifest', default=None, help='SQLite manifest where the saved composites are recorded.')
+    parser.add_argument('--metrics', default=None, help='Export stage timings there (.prom for Prometheus, JSON lines otherwise).')
+    parser.add_argument('--profile', default=None, help='Profile the run with cProfile and save the statistics there.')
+    args = parser.parse_args(argv)
+    if args.shards and args.manifest is not None:
+        parser.error('--manifest records loose files and cannot be combined with --shards')
+
+    manifest = Manifest(args.manifest) if args.manifest is not None else None
+    start_time = time.perf_counter()
+    with profiled(args.profile), Checkpoint(args.checkpoint, resume=args.resume) as checkpoint:
+        if args.shards:
+            with ShardWriter(args.output_directory, prefix='superimposition') as sink:
+                process_images(args.ir_images_directory, args.background_images_directory, args.output_directory,
+                               sink=sink, workers=args.workers, search_pattern=args.patterns,
+                               extensions=args.extensions, index_path=args.index, match=args.match,
+                               checkpoint=checkpoint)
+        else:
+            process_images(args.ir_images_directory, args.background_images_directory, args.output_directory,
+                           workers=args.workers, search_pattern=args.patterns, extensions=args.extensions,
+                           index_path=args.index, match=args.match, manifest=manifest, checkpoint=checkpoint)
+    if manifest is not None:
+        manifest.close()
+    print(checkpoint.summary(time.perf_counter() - start_time))
+    print(metrics.summary())
+    if args.metrics is not None:
+        metrics.export(args.metrics, 'superposition_cut')
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,172 @@
+"""
+This script provides a lazy dataset of superposition composites that are generated on demand.
+
+Each sample is composed in memory from cached ship and background images, so synthetic images
+never go through an encode, write, read and decode cycle before reaching the training loader.
+Samples are deterministic per index: the same seed and index always give the same composite,
+whichever worker process generates it.
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from common.photometric import BackgroundMatcher
+from superposition_cut import iter_ir_images, superposition_cut, yolo_box
+
+class SyntheticShipDataset:
+    """
+    Indexable dataset of (image, boxes) pairs composed on the fly.
+
+    Args:
+        ir_images (list): Paths to the infrared ship cut-outs.
+        background_images (list): Paths to the background images.
+        length (int or None): Number of samples, defaults to one per ship.
+        seed (int): Seed combined with the index to make every sample reproducible.
+        match (bool): Whether to match the ship intensities to the local background.
+        class_id (int): Class written in the boxes (0 is boat).
+    """
+
+    def __init__(self, ir_images, background_images, length=None, seed=0, match=False, class_id=0):
+        if not ir_images or not background_images:
+            raise ValueError("Both ship and background images are required.")
+        self.ir_images = list(ir_images)
+        self.background_images = list(background_images)
+        self.length = len(self.ir_images) if length is None else length
+        self.seed = seed
+        self.match = match
+        self.class_id = class_id
+        self._ships = {}
+        self._backgrounds = {}
+        self._matchers = {}
+
+    def __getstate__(self):
+        # Caches stay in the process that filled them; workers build their own.
+        state = self.__dict__.copy()
+        state['_ships'] = {}
+        state['_backgrounds'] = {}
+        state['_matchers'] = {}
+        return state
+
+    def __len__(self):
+        return self.length
+
+    def _ship(self, path):
+        if path not in self._ships:
+            with Image.open(path) as image:
+                self._ships[path] = image.copy()
+        return self._ships[path]
+
+    def _background(self, path):
+        if path not in self._backgrounds:
+            with Image.open(path) as image:
+                self._backgrounds[path] = image.convert('RGB')
+        return self._backgrounds[path]
+
+    def _matcher(self, path):
+        if path not in self._matchers:
+            self._matchers[path] = BackgroundMatcher(np.asarray(self._background(path)))
+        return self._matchers[path]
+
+    def __getitem__(self, index):
+        """
+        Compose the sample at an index.
+
+        Args:
+            index (int): Sample index, negative values count from the end.
+
+        Returns:
+            tuple: (image, boxes) where image is an (H, W, 3) uint8 array and boxes is an (N, 5)
+                float32 array of YOLO rows (class, x_center, y_center, width, height).
+        """
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError(f"Index {index} out of range for {self.length} samples.")
+
+        rng = random.Random(self.seed * 1000003 + index)
+        ir_image = self.ir_images[index % len(self.ir_images)]
+        background_image = rng.choice(self.background_images)
+
+        matcher = self._matcher(background_image) if self.match else None
+        img_background = self._background(background_image).copy()
+        result_image, box = superposition_cut(self._ship(ir_image), img_background, return_box=True,
+                                              matcher=matcher, rng=rng)
+
+        boxes = np.array([(self.class_id, *yolo_box(box, result_image.size))], dtype=np.float32)
+        return np.asarray(result_image), boxes
+
+    def __iter__(self):
+        for index in range(self.length):
+            yield self[index]
+
+def benchmark(dataset, count, output_directory=None):
+    """
+    Compare the on-the-fly dataset with materializing the same samples on disk and loading them back.
+
+    Args:
+        dataset (SyntheticShipDataset): Dataset to benchmark.
+        count (int): Number of samples generated by each path.
+        output_directory (str or None): Directory for the materialized images, a temporary one if None.
+
+    Returns:
+        dict: Samples per second of the 'on_the_fly' and 'disk' paths.
+    """
+    count = min(count, len(dataset))
+    temporary = output_directory is None
+    if temporary:
+        output_directory = tempfile.mkdtemp(prefix='synthetic_benchmark_')
+    os.makedirs(output_directory, exist_ok=True)
+
+    # Warm the caches so both paths start from decoded assets.
+    dataset[0]
+
+    start_time = time.perf_counter()
+    for index in range(count):
+        dataset[index]
+    on_the_fly = count / (time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    for index in range(count):
+        image, boxes = dataset[index]
+        image_path = os.path.join(output_directory, f'{index:08d}.png')
+        Image.fromarray(image).save(image_path)
+        np.savetxt(os.path.join(output_directory, f'{index:08d}.txt'), boxes, fmt='%g')
+    for index in range(count):
+        with Image.open(os.path.join(output_directory, f'{index:08d}.png')) as image:
+            np.asarray(image)
+        np.loadtxt(os.path.join(output_directory, f'{index:08d}.txt'), ndmin=2)
+    disk = count / (time.perf_counter() - start_time)
+
+    if temporary:
+        shutil.rmtree(output_directory)
+
+    print(f"On the fly: {on_the_fly:.1f} samples/s")
+    print(f"Materialized on disk: {disk:.1f} samples/s")
+    return {'on_the_fly': on_the_fly, 'disk': disk}
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the on-the-fly superposition dataset.')
+    parser.add_argument('ir_images_directory', help='Directory containing infrared images.')
+    parser.add_argument('background_images_directory', help='Directory containing background images.')
+    parser.add_argument('--count', type=int, default=200, help='Number of samples per path.')
+    parser.add_argument('--seed', type=int, default=0, help='Dataset seed.')
+    parser.add_argument('--match', action='store_true', help='Enable photometric matching.')
+    args = parser.parse_args()
+
+    ir_images = sorted(iter_ir_images(args.ir_images_directory))
+    background_images = sorted(os.path.join(args.background_images_directory, name)
+                               for name in os.listdir(args.background_images_directory))
+    dataset = SyntheticShipDataset(ir_images, background_images, length=args.count, seed=args.seed, match=args.match)
+    benchmark(dataset, args.count)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Single entry point for the scripts of the repository.
+
+    python pipeline.py capture [options]      image_capture/get_images.py
+    python pipeline.py blend [options]        image_generation/blended_opencv_with_border/blend_images_with_border.py
+    python pipeline.py composite [options]    image_generation/superposition_cut/superposition_cut.py
+    python pipeline.py relabel [options]      dataset_distribution/change_to_class_boat.py
+    python pipeline.py split [--method histogram|random] [options]
+
+The options after the subcommand are passed to the script, so `python pipeline.py split --help`
+lists the options of the split script. Scripts are imported only when their subcommand runs,
+so starting the CLI does not load OpenCV, NumPy, PIL, requests or onvif.
+"""
+
+import argparse
+import importlib
+import os
+import sys
+
+repository_directory = os.path.dirname(os.path.abspath(__file__))
+
+# Subcommand: (help, {method: (script directory, module)}); the first method is the default
+COMMANDS = {
+    'capture': ('Capture images at the camera presets.', {
+        'capture': ('image_capture', 'get_images'),
+    }),
+    'blend': ('Alpha blend foreground images onto backgrounds.', {
+        'blend': (os.path.join('image_generation', 'blended_opencv_with_border'), 'blend_images_with_border'),
+    }),
+    'composite': ('Superimpose infrared ship cut-outs onto sea backgrounds.', {
+        'composite': (os.path.join('image_generation', 'superposition_cut'), 'superposition_cut'),
+    }),
+    'relabel': ('Change the class of every YOLO label to boat.', {
+        'relabel': ('dataset_distribution', 'change_to_class_boat'),
+    }),
+    'split': ('Split images and labels into training and validation sets.', {
+        'histogram': ('dataset_distribution', 'histogram_distribution_valid_train'),
+        'random': ('dataset_distribution', 'random_distribution_valid_train'),
+    }),
+}
+
+def load_script(directory, module_name):
+    """
+    Import a script as a module.
+
+    The directory of the script is put on the module search path first, as when the script
+    is run directly, so its imports of sibling scripts keep working.
+
+    Args:
+        directory (str): Directory of the script, relative to the repository.
+        module_name (str): Name of the script without extension.
+
+    Returns:
+        module: The imported script.
+    """
+    script_directory = os.path.join(repository_directory, directory)
+    if script_directory not in sys.path:
+        sys.path.insert(0, script_directory)
+    return importlib.import_module(module_name)
+
+def build_parser():
+    """
+    Build the parser of the subcommands.
+
+    Returns:
+        argparse.ArgumentParser: The parser.
+    """
+    parser = argparse.ArgumentParser(description='Maritime dual camera dataset pipeline.')
+    subparsers = parser.add_subparsers(dest='command', required=True, metavar='command')
+    for command, (help, methods) in COMMANDS.items():
+        subparser = subparsers.add_parser(command, help=help, add_help=False, allow_abbrev=False)
+        if len(methods) > 1:
+            subparser.add_argument('--method', choices=list(methods), default=next(iter(methods)),
+                                   help='Script used for the subcommand.')
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args, script_argv = parser.parse_known_args(argv)
+
+    methods = COMMANDS[args.command][1]
+    method = getattr(args, 'method', next(iter(methods)))
+    directory, module_name = methods[method]
+
+    script = load_script(directory, module_name)
+    # The usage messages of the script then read 'pipeline.py <command>'
+    sys.argv[0] = f'{parser.prog} {args.command}'
+    return script.main(script_argv)
+
+if __name__ == "__main__":
+    sys.exit(main())